@@ -1,6 +1,9 @@
 from Engine.Core.app import *
 from Engine.Utils.utils import Colors
 
+from time import perf_counter
+
+import numpy as np
 import pygame
 
 
@@ -13,20 +16,23 @@ class PygameApp(App):
         * Make keycodes in sub-applications not be dependent on pygame
         * Expose public getters for params: window, windowSize, windowCenter, clock, isKeyPressed, isMouseButtonPressed to make sure they
           cannot be set through applications
-        * Add delta-time parameter
     """
 
-    def __init__(self, windowSize: tuple, fps: int = 60, caption: str = "PyGame Window", camera: Camera2D = None):
+    def __init__(self, windowSize: tuple, fps: int = 60, caption: str = "PyGame Window", camera: Camera2D = None,
+                 updateRate: int = 0, maxUpdates: int = 5, maxFrameSkip: int = 0):
         """
         Initializes the pygame module as well as the application.
 
         :param windowSize: The size of the window in pixels
         :param fps: What framerate the application should run at. Set to 0 for uncapped framerate. (default: 60)
         :param caption: The caption of the window. (default: "Game Window")
+        :param updateRate: How many times per second on_fixed_update is called, independent of the framerate. Set to 0 to disable fixed updates. (default: 0)
+        :param maxUpdates: The maximum amount of fixed updates per frame, the application slows down instead of falling further behind. (default: 5)
+        :param maxFrameSkip: The maximum amount of frames in a row that are not drawn while the fixed updates are behind. (default: 0)
         """
 
         # Initialize application
-        super().__init__(windowSize, fps, caption, camera)
+        super().__init__(windowSize, fps, caption, camera, updateRate, maxUpdates, maxFrameSkip)
 
         # Initialize pygame module
         pygame.init()
@@ -36,9 +42,10 @@ class PygameApp(App):
         # Initialize App variables
         self.window = pygame.display.get_surface()
         self.clock = pygame.time.Clock()
-        self.deltaTime = 0
         self._running = False
 
+        self._fonts = {}  # Fonts by size, loaded when first used
+
         self._events = pygame.event.get()
         self.isKeyPressed = pygame.key.get_pressed()
         self.isMouseButtonPressed = pygame.mouse.get_pressed(3)
@@ -107,6 +114,45 @@ class PygameApp(App):
         else:
             pygame.draw.circle(self.window, color, position, radius, borderWidth)
 
+    def draw_circles(self, positions, radii, colors, fromCamera=False) -> None:
+        """
+        Draw many filled circles at once. All circles are transformed with one array operation and the ones outside the window
+        are culled. Circles smaller than a pixel are written straight into the window's pixels, only the rest are drawn one by one.
+
+        :param positions: (N, 2) array of the centers of the circles
+        :param radii: (N,) array of the radii of the circles
+        :param colors: (N, 3) array of the colors of the circles
+        :param fromCamera: Whether or not to draw from the mainCamera's perspective. (default: False)
+        :return: None
+        """
+
+        positions, radii, colors = np.asarray(positions, dtype=float), np.asarray(radii, dtype=float), np.asarray(colors)
+        width, height = self.window.get_size()
+
+        if fromCamera:
+            zoom = self.mainCamera.zoom
+            x = (positions[:, 0] - self.mainCamera.position.x) * zoom + self.windowSize.x / 2
+            y = -(positions[:, 1] - self.mainCamera.position.y) * zoom + self.windowSize.y / 2  # Flip y-axis (y-axis is inverted in pygame)
+            radii = radii * zoom
+        else:
+            x, y = positions[:, 0], positions[:, 1]
+
+        visible = np.flatnonzero((x + radii >= 0) & (x - radii < width) & (y + radii >= 0) & (y - radii < height))
+        x, y, radii, colors = x[visible], y[visible], radii[visible], colors[visible]
+
+        # Sub-pixel circles only cover the pixel of their center
+        small = radii < 1
+        column, row = x[small].astype(np.int64), y[small].astype(np.int64)
+        inside = (0 <= column) & (column < width) & (0 <= row) & (row < height)
+        if inside.any():
+            pixels = pygame.surfarray.pixels3d(self.window)  # Locks the window until it is deleted
+            pixels[column[inside], row[inside]] = colors[small][inside]
+            del pixels
+
+        large = ~small
+        for center, radius, color in zip(np.stack((x[large], y[large]), axis=1).tolist(), radii[large].tolist(), colors[large].tolist()):
+            pygame.draw.circle(self.window, color, center, radius)
+
     def draw_rect(self, position, width, height, color=Colors.WHITE, borderWidth=0, fromCamera=False) -> None:
         """
         Draw a rectangle on the screen.
@@ -149,6 +195,21 @@ class PygameApp(App):
         else:
             pygame.draw.line(self.window, color, start, end, width * self.mainCamera.zoom)
 
+    def draw_text(self, text, position, color=Colors.WHITE, size=16) -> None:
+        """
+        Draw a line of text on the screen, in the default font.
+
+        :param text: The text
+        :param position: The position of the top left corner of the text
+        :param color: The color of the text
+        :param size: The height of the text in pixels. (default: 16)
+        :return: None
+        """
+
+        if size not in self._fonts:
+            self._fonts[size] = pygame.font.Font(None, size)
+        self.window.blit(self._fonts[size].render(text, True, color), position)
+
     def _App__draw(self) -> None:
         """
         Private method for updating the screen. Calls on_draw after clearing the screen.
@@ -158,6 +219,8 @@ class PygameApp(App):
 
         self.window.fill(Colors.BLACK)
         self.on_draw()
+        if self.profiler.enabled:
+            self.draw_profiler()
 
         pygame.display.update()
 
@@ -170,6 +233,7 @@ class PygameApp(App):
 
         self._running = False
         self.on_quit()
+        self.profiler.close()
         pygame.quit()
 
     def run(self) -> None:
@@ -181,10 +245,23 @@ class PygameApp(App):
 
         self._running = True
 
+        profiler = self.profiler
         while self._running:
-            self._App__events()  # Make sure we update the engine's events before we call on_update
-            self.on_update()
-            self._App__draw()
-            self.deltaTime = self.clock.tick(self.fps) / 1000  # Run application on desired framerate
+            start = perf_counter()
+            with profiler.phase("events"):
+                self._App__events()  # Make sure we update the engine's events before we call on_update
+            with profiler.phase("update"):
+                self.on_update()
+            with profiler.phase("fixed update"):
+                draw = self._App__fixed_update()  # Fixed updates run at updateRate, drawing at the framerate
+            if draw:
+                with profiler.phase("draw"):
+                    self._App__draw()
+            self.frameTime = perf_counter() - start
+            if self.governor is not None:
+                self.governor.update(self.frameTime)
+            with profiler.phase("wait"):
+                self.deltaTime = self.clock.tick(self.fps) / 1000  # Run application on desired framerate
+            profiler.end_frame()
 
         self.quit()
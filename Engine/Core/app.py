@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 
 from Engine.Utils.utils import Vector2
 from Engine.Utils.camera2d import Camera2D
+from Engine.Core.profiler import Profiler
+from Engine.Core.governor import Governor, Knob
 
 
 class App(ABC):
@@ -12,13 +14,17 @@ class App(ABC):
         - Add layers for rendering.
     """
 
-    def __init__(self, windowSize: tuple, fps: int = 60, caption: str = "Application Window", camera: Camera2D = None):
+    def __init__(self, windowSize: tuple, fps: int = 60, caption: str = "Application Window", camera: Camera2D = None,
+                 updateRate: int = 0, maxUpdates: int = 5, maxFrameSkip: int = 0):
         """
         Initialize the application.
 
         :param windowSize: The size of the window in pixels
         :param fps: What framerate the application should run at. Set to 0 for uncapped framerate. (default: 60)
         :param caption: The caption of the window. (default: "Game Window")
+        :param updateRate: How many times per second on_fixed_update is called, independent of the framerate. Set to 0 to disable fixed updates. (default: 0)
+        :param maxUpdates: The maximum amount of fixed updates per frame, the application slows down instead of falling further behind. (default: 5)
+        :param maxFrameSkip: The maximum amount of frames in a row that are not drawn while the fixed updates are behind. (default: 0)
         """
 
         self.windowSize = Vector2(windowSize)
@@ -26,9 +32,20 @@ class App(ABC):
         self._caption = caption
         self.fps = fps
 
+        self.updateRate = updateRate
+        self.maxUpdates = maxUpdates
+        self.maxFrameSkip = maxFrameSkip
+        self.deltaTime = 0
+        self.frameTime = 0  # The time the last frame took without waiting for the framerate cap
+        self.alpha = 1.0  # How far the drawn frame is between the last two fixed updates, used for interpolation
+        self._accumulator = 0.0
+        self._skippedFrames = 0
+
         self.mainCamera = camera if camera is not None else Camera2D(Vector2(0, 0), self.windowSize)
 
         self.debug = False
+        self.profiler = Profiler()  # Disabled until profiler.enabled is set, its overlay is drawn while it is enabled
+        self.governor = None  # Set to a Governor to adapt settings to the frame time
 
     @property
     def caption(self) -> str:
@@ -72,6 +89,38 @@ class App(ABC):
 
         pass
 
+    def __fixed_update(self) -> bool:
+        """
+        Call on_fixed_update once for every fixed time step that has passed since the last frame.
+
+        :return: Whether the frame should be drawn
+        """
+
+        if self.updateRate <= 0:
+            return True
+
+        step = 1 / self.updateRate
+        self._accumulator += self.deltaTime
+
+        updates = 0
+        while self._accumulator >= step and updates < self.maxUpdates:
+            self.on_fixed_update(step)
+            self.profiler.count("fixed updates")
+            self._accumulator -= step
+            updates += 1
+
+        behind = self._accumulator >= step
+        if behind and self._skippedFrames < self.maxFrameSkip:
+            self._skippedFrames += 1  # Spend the next frame on catching up instead of drawing
+            return False
+
+        self._skippedFrames = 0
+        if behind:
+            self._accumulator %= step  # Drop the time we cannot catch up with instead of falling further behind
+
+        self.alpha = self._accumulator / step
+        return True
+
     @abstractmethod
     def run(self):
         """
@@ -84,12 +133,42 @@ class App(ABC):
     def draw_circle(self, pos, radius, color, borderWidth=0, fromCamera=False):
         raise NotImplementedError("draw_circle is not implemented")
 
+    def draw_circles(self, positions, radii, colors, fromCamera=False):
+        """
+        Draw many filled circles. Applications should override this with a batched implementation.
+
+        :param positions: (N, 2) array of the centers of the circles
+        :param radii: (N,) array of the radii of the circles
+        :param colors: (N, 3) array of the colors of the circles
+        :param fromCamera: Whether or not to draw from the mainCamera's perspective. (default: False)
+        :return: None
+        """
+
+        for position, radius, color in zip(positions, radii, colors):
+            self.draw_circle(Vector2(position[0], position[1]), radius, tuple(color), fromCamera=fromCamera)
+
     def draw_rect(self, position, width, height, color, borderWidth=0, fromCamera=False):
         raise NotImplementedError("draw_rect is not implemented")
 
     def draw_line(self, start, end, color, width=1, fromCamera=False):
         raise NotImplementedError("draw_line is not implemented")
 
+    def draw_text(self, text, position, color, size=16):
+        raise NotImplementedError("draw_text is not implemented")
+
+    def draw_profiler(self, position=(8, 8), size=16) -> None:
+        """
+        Draw the rolling statistics of the profiler and the state of the governor as an overlay in the window.
+
+        :param position: The position of the top left corner of the overlay. (default: (8, 8))
+        :param size: The height of a line of text in pixels. (default: 16)
+        :return: None
+        """
+
+        lines = self.profiler.lines() + (self.governor.lines() if self.governor is not None else [])
+        for row, line in enumerate(lines):
+            self.draw_text(line, (position[0], position[1] + row * size), (255, 255, 0), size)
+
     def on_update(self) -> None:
         """
         Callback for sub-applications inheriting from App.
@@ -100,6 +179,17 @@ class App(ABC):
 
         pass
 
+    def on_fixed_update(self, dt: float) -> None:
+        """
+        Callback for sub-applications inheriting from App.
+        This is called updateRate times per second, independent of the framerate, and is meant for the simulation.
+
+        :param dt: The fixed time step in seconds
+        :return: None
+        """
+
+        pass
+
     def on_draw(self) -> None:
         """
         Callback for sub-applications inheriting from App.
@@ -1 +1,3 @@
 from .Platform.pygame_app import PygameApp
+from .profiler import Profiler
+from .governor import Governor, Knob
@@ -0,0 +1,122 @@
+from typing import Callable
+
+
+class Knob:
+    """
+    A setting the governor can trade quality for speed with.
+
+    Attributes:
+        name: The name of the setting.
+        values: The allowed values, from the best quality to the cheapest. The last value is the limit of the setting.
+        apply: Called with the value whenever it changes.
+        level: The index of the current value.
+    """
+
+    def __init__(self, name: str, values: list, apply: Callable[[object], None]):
+        """
+        Initialize the knob and apply its best value.
+
+        :param name: The name of the setting
+        :param values: The allowed values, from the best quality to the cheapest
+        :param apply: Called with the value whenever it changes
+        """
+
+        self.name = name
+        self.values = list(values)
+        self.apply = apply
+        self.level = 0
+        self.apply(self.values[0])
+
+    @property
+    def value(self):
+        return self.values[self.level]
+
+    def set_level(self, level: int) -> None:
+        """
+        Change the value of the setting.
+
+        :param level: The index of the new value
+        :return: None
+        """
+
+        self.level = level
+        self.apply(self.values[level])
+
+
+class Governor:
+    """
+    Holds the frame time within a budget by lowering the quality of settings while frames take too long, and restoring it
+    when there is headroom again. Settings are lowered one step at a time in the order of the knobs (the cheapest loss of
+    quality first) and restored in the opposite order. Every change is followed by a cooldown, so the smoothed frame time
+    can show its effect before the next change.
+
+    Attributes:
+        budget: The frame time to stay below in seconds.
+        knobs: The settings, in the order they are lowered.
+        headroom: Quality is restored while the frame time is below this fraction of the budget.
+        cooldown: The amount of frames after a change before the next one.
+        smoothing: The weight of the latest frame in the smoothed frame time.
+        frameTime: The smoothed frame time in seconds.
+
+    Methods:
+        update: Feeds the time of the last frame, changing a setting if needed.
+        lines: Gets the state of the settings as lines of text.
+    """
+
+    def __init__(self, budget: float, knobs: list, headroom: float = 0.7, cooldown: int = 30, smoothing: float = 0.1):
+        """
+        Initialize the governor, with every setting at its best quality.
+
+        :param budget: The frame time to stay below in seconds, e.g. 1 / 60
+        :param knobs: The settings, in the order they are lowered
+        :param headroom: Quality is restored while the frame time is below this fraction of the budget. (default: 0.7)
+        :param cooldown: The amount of frames after a change before the next one. (default: 30)
+        :param smoothing: The weight of the latest frame in the smoothed frame time. (default: 0.1)
+        """
+
+        self.budget = budget
+        self.knobs = knobs
+        self.headroom = headroom
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.frameTime = None
+        self.__wait = cooldown  # Frames until the next change is allowed
+
+    def update(self, frameTime: float) -> None:
+        """
+        Feed the time of the last frame, without the time spent waiting for the framerate cap.
+        Lowers one setting if the smoothed frame time is over budget, or restores one if there is headroom.
+
+        :param frameTime: The time the last frame took in seconds
+        :return: None
+        """
+
+        self.frameTime = frameTime if self.frameTime is None else self.frameTime + (frameTime - self.frameTime) * self.smoothing
+
+        if self.__wait > 0:
+            self.__wait -= 1
+            return
+
+        if self.frameTime > self.budget:
+            for knob in self.knobs:
+                if knob.level < len(knob.values) - 1:
+                    knob.set_level(knob.level + 1)
+                    self.__wait = self.cooldown
+                    return
+        elif self.frameTime < self.budget * self.headroom:
+            for knob in reversed(self.knobs):
+                if knob.level > 0:
+                    knob.set_level(knob.level - 1)
+                    self.__wait = self.cooldown
+                    return
+
+    def lines(self) -> list:
+        """
+        Get the smoothed frame time and the value of every setting as lines of text.
+
+        :return: List of strings
+        """
+
+        frameTime = self.frameTime or 0
+        return [f"budget {frameTime * 1000:6.2f} / {self.budget * 1000:.2f} ms"] + \
+               [f"{knob.name:<12} {knob.value}  ({knob.level}/{len(knob.values) - 1})" for knob in self.knobs]
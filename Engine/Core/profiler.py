@@ -0,0 +1,236 @@
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+import csv
+import os
+
+
+_DISABLED = nullcontext()  # Shared by every phase while profiling is disabled, so a disabled phase costs one call
+
+
+class _Phase:
+    """
+    Context manager timing one phase of a frame. The time of phases inside it is not counted for it,
+    so the times of all phases of a frame add up to the frame time.
+    """
+
+    __slots__ = ('profiler', 'name', 'parent', 'start', 'children')
+
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.parent = self.profiler._current
+        self.profiler._current = self
+        self.children = 0.0
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = perf_counter() - self.start
+        self.profiler._add(self.name, elapsed - self.children)
+        self.profiler._current = self.parent
+        if self.parent is not None:
+            self.parent.children += elapsed
+
+
+class Profiler:
+    """
+    Collects the time spent in named phases of every frame and per-frame counters (e.g. tree nodes visited), keeps rolling
+    statistics of the last frames for an on-screen overlay and streams every frame to a CSV file.
+    While disabled, phase returns a shared no-op context manager and count returns immediately.
+
+    Attributes:
+        enabled: Whether phases and counters are recorded.
+        history: The amount of frames the rolling statistics are taken over.
+        fields: The names of all phases and counters seen so far, in the order they were first seen.
+        frames: The recorded frames, newest last, as dictionaries of phase times in seconds and counters.
+
+    Methods:
+        phase: Times a phase of the current frame.
+        count: Adds to a counter of the current frame.
+        end_frame: Finishes the current frame.
+        stats: Gets the rolling average and maximum of every phase and counter.
+        lines: Gets the rolling statistics as lines of text.
+        open_csv: Starts streaming every frame to a CSV file.
+        close: Closes the CSV file.
+    """
+
+    def __init__(self, enabled: bool = False, history: int = 120):
+        """
+        Initialize the profiler.
+
+        :param enabled: Whether to record from the start. (default: False)
+        :param history: The amount of frames the rolling statistics are taken over. (default: 120)
+        """
+
+        self.enabled = enabled
+        self.history = history
+        self.fields = []
+        self.frames = deque(maxlen=history)
+
+        self._current = None  # The innermost running phase
+        self.__frame = {}
+        self.__frameStart = perf_counter()
+        self.__phases = set()
+        self.__counters = set()
+        self.__csvPath = None
+        self.__csvFile = None
+        self.__csvWriter = None
+        self.__csvFields = None
+        self.__frameIndex = 0
+
+    def phase(self, name: str):
+        """
+        Time a phase of the current frame, used as a context manager: with profiler.phase("gravity"): ...
+        A phase can run several times per frame, its times are summed.
+
+        :param name: The name of the phase
+        :return: A context manager timing the phase
+        """
+
+        if not self.enabled:
+            return _DISABLED
+
+        if name not in self.__phases:
+            self.__phases.add(name)
+            self.fields.append(name)
+        return _Phase(self, name)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """
+        Add to a counter of the current frame.
+
+        :param name: The name of the counter
+        :param amount: The amount to add. (default: 1)
+        :return: None
+        """
+
+        if not self.enabled:
+            return
+
+        if name not in self.__counters:
+            self.__counters.add(name)
+            self.fields.append(name)
+        self.__frame[name] = self.__frame.get(name, 0) + amount
+
+    def _add(self, name: str, seconds: float) -> None:
+        """
+        Add the time of a finished phase to the current frame.
+
+        :param name: The name of the phase
+        :param seconds: The time spent in the phase
+        :return: None
+        """
+
+        self.__frame[name] = self.__frame.get(name, 0.0) + seconds
+
+    def end_frame(self) -> None:
+        """
+        Finish the current frame: add it to the rolling statistics and the CSV file, and start the next one.
+
+        :return: None
+        """
+
+        now = perf_counter()
+        frameTime, self.__frameStart = now - self.__frameStart, now
+        if not self.enabled:
+            self.__frame = {}
+            return
+
+        frame, self.__frame = self.__frame, {}
+        frame['frame'] = frameTime
+        self.frames.append(frame)
+        self.__frameIndex += 1
+
+        if self.__csvFile is not None:
+            self.__write(frame)
+
+    def stats(self) -> dict:
+        """
+        Get the rolling average and maximum of every phase (in seconds) and counter over the recorded frames.
+        A phase or counter missing from a frame counts as 0 for that frame.
+
+        :return: Dictionary of names to (average, maximum), with the frame time under "frame"
+        """
+
+        if not self.frames:
+            return {}
+
+        stats = {}
+        for name in ['frame'] + self.fields:
+            values = [frame.get(name, 0) for frame in self.frames]
+            stats[name] = (sum(values) / len(values), max(values))
+        return stats
+
+    def lines(self) -> list:
+        """
+        Get the rolling statistics as lines of text: phase times in milliseconds, then the counters.
+
+        :return: List of strings
+        """
+
+        stats = self.stats()
+        if not stats:
+            return []
+
+        average, maximum = stats.pop('frame')
+        lines = [f"frame {average * 1000:6.2f} ms  max {maximum * 1000:6.2f}  ({1 / average if average > 0 else 0:.0f} fps)"]
+        for name, (average, maximum) in stats.items():
+            if name in self.__phases:
+                lines.append(f"{name:<12} {average * 1000:6.2f} ms  max {maximum * 1000:6.2f}")
+        for name, (average, maximum) in stats.items():
+            if name in self.__counters:
+                lines.append(f"{name:<12} {average:9.0f}  max {maximum:9.0f}")
+        return lines
+
+    def open_csv(self, path: str) -> None:
+        """
+        Start streaming every recorded frame to a CSV file, one row per frame with the phase times in seconds and the counters.
+        Columns are added when a new phase or counter shows up.
+
+        :param path: The path of the file, it is overwritten if it exists
+        :return: None
+        """
+
+        self.close()
+        self.__csvPath = path
+        self.__csvFile = open(path, 'w', newline='')
+        self.__csvFields = None
+
+    def __write(self, frame: dict) -> None:
+        """
+        Write a frame to the CSV file, rewriting the file with a new header if the frame has a new phase or counter.
+
+        :param frame: The frame
+        :return: None
+        """
+
+        fields = ['index', 'frame'] + self.fields
+        if fields != self.__csvFields:
+            # New columns only show up in the first frames, so rewriting the rows written so far is cheap
+            self.__csvFile.close()
+            with open(self.__csvPath, newline='') as file:
+                rows = list(csv.DictReader(file))
+
+            self.__csvFile = open(self.__csvPath, 'w', newline='')
+            self.__csvWriter = csv.DictWriter(self.__csvFile, fields, restval=0)
+            self.__csvWriter.writeheader()
+            self.__csvWriter.writerows(rows)
+            self.__csvFields = fields
+
+        self.__csvWriter.writerow({'index': self.__frameIndex, **frame})
+
+    def close(self) -> None:
+        """
+        Close the CSV file, if one is open.
+
+        :return: None
+        """
+
+        if self.__csvFile is not None:
+            self.__csvFile.flush()
+            os.fsync(self.__csvFile.fileno())
+            self.__csvFile.close()
+            self.__csvFile = None
@@ -1,7 +1,8 @@
 from Engine.engine import *
 
-from body import Body
+from body import Body, BodySystem
 from quadtree import QuadTree
+from spatialhash import SpatialHash
 
 import pygame  # Only for keycodes!
 import random
@@ -14,11 +15,11 @@ class Game(PygameApp):
 	"""
 
 	def __init__(self, windowSize: tuple):
-		super().__init__(windowSize, 60, camera=Camera2D(Vector2(0, 0), Vector2(windowSize), 1))
+		super().__init__(windowSize, 60, camera=Camera2D(Vector2(0, 0), Vector2(windowSize), 1), updateRate=60)
 
 		self.bounds = Rect(-self.windowSize.x / 2, self.windowSize.y / 2, self.windowSize.x, self.windowSize.y)
 
-		self.bodies = [Body(Vector2(0, 250), 1000, Vector2(0, -3)), Body(Vector2(0, -250), 250, Vector2(0, 3))]
+		self.bodies = BodySystem([Body(Vector2(0, 250), 1000, Vector2(0, -3)), Body(Vector2(0, -250), 250, Vector2(0, 3))])
 
 		# Uncomment to generate random bodies
 
@@ -26,7 +27,7 @@ class Game(PygameApp):
 		maxSpeed = 3
 		minMass, maxMass = 10, 100
 
-		self.bodies = []
+		self.bodies = BodySystem(capacity=bodies)
 
 		for _ in range(bodies):
 			pos = Vector2(random.randint(self.bounds.x, (self.bounds.x + self.bounds.width)),
@@ -36,10 +37,19 @@ class Game(PygameApp):
 
 			vel = Vector2(random.randint(-maxSpeed, maxSpeed), random.randint(-maxSpeed, maxSpeed))
 
-			self.bodies.append(Body(pos, mass, vel))
+			self.bodies.add(pos, mass, vel)
 
 		# self.debug = True  # Comment to disable debug mode
 
+		self.timeStep = 4  # Continuous collision detection keeps fast bodies from tunnelling through each other at larger time steps
+
+		# The quadtree is built once and then refitted every update as the bodies move
+		self.quadTree = QuadTree(self.bounds)
+		self.quadTree.build(self.bodies)
+
+		# The spatial hash is rebuilt every update, its cells are sized from the largest body
+		self.spatialHash = SpatialHash()
+
 	def camera_control(self):
 		if self.isKeyPressed[pygame.K_w]:
 			self.mainCamera.move(Vector2(0, 1))
@@ -56,11 +66,11 @@ class Game(PygameApp):
 			self.mainCamera.zoom_out()
 
 	def draw_debug(self):
-		self.quadTree.draw(self)
+		self.spatialHash.build(self.bodies.positions, self.bodies.radii)
+		self.spatialHash.draw(self)
 
 	def on_draw(self):
-		for body in self.bodies:
-			body.draw(self)
+		self.bodies.draw(self)
 
 		if self.debug:
 			self.draw_debug()
@@ -71,29 +81,37 @@ class Game(PygameApp):
 
 		self.camera_control()
 
-		# Build quadtree for faster calculations
-		self.quadTree = QuadTree(self.bounds)
-
-		for body in self.bodies:
-			self.quadTree.insert(body)
-
+	def on_fixed_update(self, dt):
 		# COLLISION DETECTION
+		"""
+		# Refit the quadtree to the new body positions (rebuilds it if too many bodies changed leaf)
+		self.quadTree.refit(self.bodies)
+
 		for i, body in enumerate(self.bodies):
-			"""
 			# NAIVE COLLISION DETECTION
 			for body2 in self.bodies[i:]:
 				if body != body2:
 					body.collide(body2)
-			"""
-
-			# QUADTREE COLLISION DETECTION
-			self.quadTree.collide(body)
 
 			body.collide(self.bounds)
 
+		# QUADTREE COLLISION DETECTION
+		self.bodies.collide_pairs(*self.quadTree.collision_pairs(self.bodies))
+		"""
+
+		"""
+		# SPATIAL HASH COLLISION DETECTION (every pair once, resolved in batches)
+		self.spatialHash.build(self.bodies.positions, self.bodies.radii)
+		self.bodies.collide_pairs(*self.spatialHash.colliding_pairs())
+
+		self.bodies.collide_bounds(self.bounds)
+		"""
+
+		# CONTINUOUS COLLISION DETECTION (resolved at the time of impact during the update)
+		self.bodies.collide_continuous(self.timeStep, self.bounds)
+
 		# UPDATE BODIES
-		for body in self.bodies:
-			body.update(1)
+		self.bodies.update(self.timeStep)
 
 
 game = Game((800, 800))
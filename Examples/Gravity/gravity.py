@@ -1,6 +1,6 @@
 from Engine.engine import *
 
-from body import Body
+from body import Body, BodySystem
 from quadtree import QuadTree
 
 import pygame  # Only for keycodes!
@@ -9,7 +9,7 @@ from numpy import random
 
 class Game(PygameApp):
 	def __init__(self, windowSize: tuple):
-		super().__init__(windowSize, 60, camera=Camera2D(Vector2(0, 0), Vector2(windowSize), 1))
+		super().__init__(windowSize, 60, camera=Camera2D(Vector2(0, 0), Vector2(windowSize), 1), updateRate=60)
 
 		scale = 1
 		self.bounds = Rect(-self.windowSize.x / 2 * scale, self.windowSize.y / 2 * scale, self.windowSize.x * scale, self.windowSize.y * scale)
@@ -18,7 +18,7 @@ class Game(PygameApp):
 		maxSpeed = 40
 		minMass, maxMass = 10, 1000
 
-		self.bodies = []
+		self.bodies = BodySystem(capacity=bodies)
 
 		for _ in range(bodies):
 			pos = Vector2(random.randint(self.bounds.x, (self.bounds.x + self.bounds.width)),
@@ -28,10 +28,14 @@ class Game(PygameApp):
 
 			vel = Vector2(random.randint(-maxSpeed, maxSpeed), random.randint(-maxSpeed, maxSpeed))
 
-			self.bodies.append(Body(pos, mass, vel))
+			self.bodies.add(pos, mass, vel)
 
 		self.debug = True  # Comment to disable debug mode
 
+		# The quadtree is built once and then refitted every update as the bodies move
+		self.quadTree = QuadTree(self.bounds)
+		self.quadTree.build(self.bodies)
+
 	def draw_debug(self):
 		self.quadTree.draw(self)
 
@@ -51,8 +55,7 @@ class Game(PygameApp):
 			self.mainCamera.zoom_out()
 
 	def on_draw(self):
-		for body in self.bodies:
-			body.draw(self)
+		self.bodies.draw(self)
 
 		if self.debug:
 			self.draw_debug()
@@ -63,26 +66,24 @@ class Game(PygameApp):
 
 		self.camera_control()
 
-		self.quadTree = QuadTree(self.bounds)
-
-		for body in self.bodies:
-			self.quadTree.insert(body)
+	def on_fixed_update(self, dt):
+		# Refit the quadtree to the new body positions (rebuilds it if too many bodies changed leaf)
+		self.quadTree.refit(self.bodies)
 
 		# GRAVITY
+		"""
 		for body in self.bodies:
-			"""
 			# NAIVE GRAVITY
 			for body2 in self.bodies:
 				if body != body2:
 					body.apply_force(body.gravitational_force(body2))
-			"""
+		"""
 
-			# QUADTREE GRAVITY
-			self.quadTree.gravity(body, 1, 5)
+		# QUADTREE GRAVITY
+		self.quadTree.group_gravity(self.bodies, 1, 5)
 
 		# UPDATE BODIES
-		for body in self.bodies:
-			body.update(1)
+		self.bodies.update(1)
 
 
 game = Game((800, 800))
@@ -0,0 +1,167 @@
+from body import BodySystem
+from quadtree import QuadTree
+from linearquadtree import LinearQuadTree
+from direct import direct_accelerations
+from fmm import fmm_accelerations
+from benchmark import SCENARIOS
+
+from argparse import ArgumentParser
+from itertools import product
+from time import perf_counter
+import json
+
+import numpy as np
+
+
+PERCENTILES = (50, 90, 99, 100)
+
+
+# SOLVERS
+# Every solver calculates the accelerations of all bodies from scratch (building its tree included) and returns them with
+# the amount of tree nodes it visited (None if it does not count them)
+
+def _quadtree(bodies: BodySystem, bounds, g: float, theta: float, leafCapacity: int) -> tuple:
+	tree = QuadTree(bounds, leafCapacity=leafCapacity)
+	tree.build(bodies)
+	bodies.accelerations = 0
+	for body in bodies:
+		tree.gravity(body, theta, g)
+	return bodies.accelerations.copy(), None
+
+
+def _group_quadtree(bodies: BodySystem, bounds, g: float, theta: float, leafCapacity: int) -> tuple:
+	tree = QuadTree(bounds, leafCapacity=leafCapacity)
+	tree.build(bodies)
+	bodies.accelerations = 0
+	tree.group_gravity(bodies, theta, g)
+	return bodies.accelerations.copy(), tree.counters['gravity nodes']
+
+
+def _linear_quadtree(bodies: BodySystem, bounds, g: float, theta: float, leafCapacity: int) -> tuple:
+	tree = LinearQuadTree(bounds, bodies.positions, bodies.masses, bodies.radii, leafCapacity)
+	return tree.accelerations(bodies.positions, bodies.radii, theta, g), None
+
+
+def _fmm(bodies: BodySystem, bounds, g: float, order: int, leafCapacity: int) -> tuple:
+	return fmm_accelerations(bodies.positions, bodies.masses, bodies.radii, g, order, leafCapacity), None
+
+
+# Solver name -> (function, names of its two settings)
+SOLVERS = {'quadtree': (_quadtree, ('theta', 'leafCapacity')),
+           'quadtree group': (_group_quadtree, ('theta', 'leafCapacity')),
+           'linear quadtree': (_linear_quadtree, ('theta', 'leafCapacity')),
+           'fmm': (_fmm, ('order', 'leafCapacity'))}
+SETTINGS = {'theta': (0.1, 0.25, 0.5, 1, 2), 'order': (2, 4, 6, 8), 'leafCapacity': (1, 4, 8, 16, 32)}
+
+
+def relative_errors(accelerations: np.ndarray, exact: np.ndarray) -> np.ndarray:
+	"""
+	Get the error of every acceleration relative to the exact acceleration of the body.
+
+	:param accelerations: (N, 2) array of approximate accelerations
+	:param exact: (N, 2) array of exact accelerations
+	:return: (N,) array of |a - exact| / |exact| (bodies without any acceleration are left out)
+	"""
+
+	magnitude = np.linalg.norm(exact, axis=1)
+	valid = magnitude > 0
+	return np.linalg.norm(accelerations - exact, axis=1)[valid] / magnitude[valid]
+
+
+def pareto_front(results: list, percentile: int = 99) -> list:
+	"""
+	Get the settings no other setting beats on both time and error: sorted by time, every setting is more accurate than
+	all faster ones.
+
+	:param results: result records of evaluate
+	:param percentile: the error percentile that is compared (default: 99)
+	:return: The records on the front, fastest first
+	"""
+
+	front = []
+	for result in sorted(results, key=lambda result: (result['time'], result['errors'][str(percentile)])):
+		if not front or result['errors'][str(percentile)] < front[-1]['errors'][str(percentile)]:
+			front.append(result)
+	return front
+
+
+def evaluate(bodies: BodySystem, bounds, solvers=tuple(SOLVERS), settings: dict = None, g: float = 5, repeat: int = 3,
+             output=print) -> list:
+	"""
+	Compare the accelerations of every solver and setting with the exact accelerations (direct summation with the same softening).
+
+	:param bodies: system of bodies, its accelerations are overwritten
+	:param bounds: the boundary of the trees
+	:param solvers: names of the solvers (default: all)
+	:param settings: values of every setting to sweep, by setting name (default: SETTINGS)
+	:param g: gravitational constant (default: 5)
+	:param repeat: the amount of times every solver is timed, the fastest counts (default: 3)
+	:param output: called with every line of the result table (default: print)
+	:return: List of result records with the solver, its settings, the time, the error percentiles and the nodes visited
+	"""
+
+	settings = {**SETTINGS, **(settings or {})}
+	exact = direct_accelerations(bodies.positions, bodies.masses, bodies.radii, g)
+
+	output(f"{'solver':<16}{'setting':>22}{'ms':>10}" + ''.join(f"{'p' + str(p) if p < 100 else 'max':>10}" for p in PERCENTILES) + f"{'nodes':>10}")
+	results = []
+	for solver in solvers:
+		function, names = SOLVERS[solver]
+		for values in product(*(settings[name] for name in names)):
+			times = []
+			for _ in range(repeat):
+				start = perf_counter()
+				accelerations, nodes = function(bodies, bounds, g, *values)
+				times.append(perf_counter() - start)
+
+			errors = np.percentile(relative_errors(accelerations, exact), PERCENTILES)
+			result = {'solver': solver, **dict(zip(names, values)), 'time': min(times),
+			          'errors': {str(p): float(error) for p, error in zip(PERCENTILES, errors)}, 'nodes': nodes}
+			results.append(result)
+
+			setting = ', '.join(f"{name}={value}" for name, value in zip(names, values))
+			output(f"{solver:<16}{setting:>22}{min(times) * 1000:>10.2f}" + ''.join(f"{error:>10.1e}" for error in errors) +
+			       f"{nodes if nodes is not None else '-':>10}")
+
+	return results
+
+
+if __name__ == '__main__':
+	parser = ArgumentParser(description="Measure the force error of the approximate gravity solvers against direct summation")
+	parser.add_argument('--scenario', choices=SCENARIOS, default='disc', help="the scenario (default: disc)")
+	parser.add_argument('--bodies', type=int, default=1000, help="the amount of bodies (default: 1000)")
+	parser.add_argument('--seed', type=int, default=0, help="seed of the scenario (default: 0)")
+	parser.add_argument('--solvers', nargs='+', choices=SOLVERS, default=['quadtree group', 'linear quadtree', 'fmm'],
+	                    help="the solvers (default: quadtree group, linear quadtree, fmm)")
+	parser.add_argument('--theta', nargs='+', type=float, default=SETTINGS['theta'], help="the values of theta to sweep")
+	parser.add_argument('--order', nargs='+', type=int, default=SETTINGS['order'], help="the FMM expansion orders to sweep")
+	parser.add_argument('--leaf', nargs='+', type=int, default=SETTINGS['leafCapacity'], help="the leaf capacities to sweep")
+	parser.add_argument('--repeat', type=int, default=3, help="the amount of times every setting is timed (default: 3)")
+	parser.add_argument('--percentile', type=int, choices=PERCENTILES, default=99, help="the error percentile of the front (default: 99)")
+	parser.add_argument('--budget', type=float, help="pick the fastest setting within this relative error")
+	parser.add_argument('--json', metavar='PATH', help="write the results to a JSON file")
+	args = parser.parse_args()
+
+	bodies, bounds = SCENARIOS[args.scenario](args.bodies, np.random.default_rng(args.seed))
+	results = evaluate(bodies, bounds, args.solvers, {'theta': args.theta, 'order': args.order, 'leafCapacity': args.leaf}, repeat=args.repeat)
+
+	key = str(args.percentile)
+	front = pareto_front(results, args.percentile)
+	print(f"\nPareto front (time vs. p{key} error)")
+	for result in front:
+		print(f"{result['time'] * 1000:10.2f} ms  {result['errors'][key]:.1e}  " +
+		      ', '.join(f"{name}={value}" for name, value in result.items() if name not in ('time', 'errors', 'nodes')))
+
+	if args.budget is not None:
+		within = [result for result in front if result['errors'][key] <= args.budget]
+		if within:
+			best = within[0]
+			print(f"\nFastest within {args.budget:.1e}: " +
+			      ', '.join(f"{name}={value}" for name, value in best.items() if name not in ('time', 'errors', 'nodes')))
+		else:
+			print(f"\nNo setting is within {args.budget:.1e}")
+
+	if args.json:
+		with open(args.json, 'w') as file:
+			json.dump({'scenario': args.scenario, 'bodies': args.bodies, 'seed': args.seed, 'results': results,
+			           'front': front}, file, indent=1)
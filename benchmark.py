@@ -0,0 +1,328 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # Drawing is timed without opening a window
+
+from Engine.engine import *
+
+from body import BodySystem
+from quadtree import QuadTree
+from linearquadtree import LinearQuadTree
+from spatialhash import SpatialHash
+from multigrid import MultiLevelGrid
+from direct import direct_gravity
+from fmm import fmm_gravity
+from integrators import INTEGRATORS
+
+from argparse import ArgumentParser
+from time import perf_counter
+import json
+import platform
+
+import numpy as np
+
+
+# SCENARIOS
+# Every scenario creates a system of count bodies and bounds containing them from a seeded random generator
+
+def _bounds(positions: np.ndarray) -> Rect:
+	"""
+	Get a square boundary containing all positions with some margin.
+
+	:param positions: (N, 2) array of positions
+	:return: The boundary (top left corner, like the bounds in main.py)
+	"""
+
+	low, high = positions.min(axis=0), positions.max(axis=0)
+	center, size = (low + high) / 2, float((high - low).max()) * 1.1 + 2
+	return Rect(int(center[0] - size / 2) - 1, int(center[1] + size / 2) + 1, int(size) + 2, int(size) + 2)
+
+
+def disc(count: int, rng: np.random.Generator) -> tuple:
+	"""
+	The scene of main.py (see Simulation.disc): bodies spinning around a large center body.
+	"""
+
+	bodies = count - 1
+	x = rng.integers(-4000, 4000, bodies).astype(float)
+	y = rng.integers(-4000, 40000, bodies) / 10
+	positions = np.stack((x, y), axis=1)
+	toCenter = -positions / np.maximum(np.linalg.norm(positions, axis=1), 1e-9)[:, None]
+	velocities = np.stack((toCenter[:, 1], -toCenter[:, 0]), axis=1) * 40
+	masses = rng.integers(10, 1000, bodies).astype(float)
+
+	positions, velocities, masses = np.vstack((positions, [0, 0])), np.vstack((velocities, [0, 0])), np.append(masses, 1000000)
+	return BodySystem.from_arrays(positions, masses, velocities), Rect(-40000, 40000, 80000, 80000)
+
+
+def gas(count: int, rng: np.random.Generator) -> tuple:
+	"""
+	The scene of the examples: light bodies with random velocities spread uniformly, at the density of the collision example.
+	"""
+
+	size = 800 * np.sqrt(count / 500)
+	positions = rng.uniform(-size / 2, size / 2, (count, 2))
+	velocities = rng.integers(-3, 4, (count, 2)).astype(float)
+	masses = rng.integers(10, 100, count).astype(float)
+	return BodySystem.from_arrays(positions, masses, velocities), _bounds(positions)
+
+
+def clustered(count: int, rng: np.random.Generator) -> tuple:
+	"""
+	Dense gaussian clusters of very different sizes, the worst case for uniform grids.
+	"""
+
+	clusters = max(count // 1000, 4)
+	centers = rng.uniform(-20000, 20000, (clusters, 2))
+	spreads = 10 ** rng.uniform(1.5, 3.5, clusters)
+	cluster = rng.integers(0, clusters, count)
+	positions = centers[cluster] + rng.normal(0, 1, (count, 2)) * spreads[cluster, None]
+	masses = rng.integers(10, 1000, count).astype(float)
+	return BodySystem.from_arrays(positions, masses), _bounds(positions)
+
+
+def giants(count: int, rng: np.random.Generator) -> tuple:
+	"""
+	A few giant bodies like the center body of main.py among many light bodies spread uniformly, the worst case for collision
+	queries sized by the largest body.
+	"""
+
+	size = 20000 * np.sqrt(count / 1000)
+	positions = rng.uniform(-size / 2, size / 2, (count, 2))
+	masses = rng.integers(10, 1000, count).astype(float)
+	masses[rng.choice(count, max(count // 1000, 3), replace=False)] = 1000000
+	return BodySystem.from_arrays(positions, masses), _bounds(positions)
+
+
+def large(count: int, rng: np.random.Generator) -> tuple:
+	"""
+	Many light bodies spread uniformly, for the solvers meant for large amounts of bodies.
+	"""
+
+	size = 100 * np.sqrt(count)
+	positions = rng.uniform(-size / 2, size / 2, (count, 2))
+	masses = rng.uniform(1, 10, count)
+	return BodySystem.from_arrays(positions, masses), _bounds(positions)
+
+
+SCENARIOS = {'disc': disc, 'gas': gas, 'clustered': clustered, 'giants': giants, 'large': large}
+SIZES = {'disc': (250, 1000, 4000), 'gas': (250, 1000, 4000), 'clustered': (250, 1000, 4000), 'giants': (250, 1000, 4000),
+         'large': (10000, 100000, 1000000)}
+
+
+# SOLVERS
+# Every solver gets the bodies and bounds, does its untimed setup and returns the function to time
+
+def _naive_gravity(bodies, bounds):
+	def run():
+		for body in bodies:
+			for body2 in bodies:
+				if body != body2:
+					body.apply_force(body.gravitational_force(body2))
+	return run
+
+
+def _quadtree(bodies, bounds, leafCapacity=8):
+	tree = QuadTree(bounds, leafCapacity=leafCapacity)
+	tree.build(bodies)
+	return tree
+
+
+def _quadtree_gravity(bodies, bounds):
+	tree = _quadtree(bodies, bounds)
+	return lambda: [tree.gravity(body, 1, 5) for body in bodies]
+
+
+def _group_gravity(bodies, bounds):
+	tree = _quadtree(bodies, bounds)
+	return lambda: tree.group_gravity(bodies, 1, 5)
+
+
+def _fused_gravity(bodies, bounds):
+	tree = _quadtree(bodies, bounds)
+	return lambda: (bodies.collide_pairs(*tree.group_gravity_pairs(bodies, 1, 5)), bodies.collide_bounds(bounds))
+
+
+def _linear_gravity(bodies, bounds):
+	return lambda: LinearQuadTree(bounds, bodies.positions, bodies.masses, bodies.radii, 8).gravity(bodies, 1, 5)
+
+
+def _naive_collision(bodies, bounds):
+	def run():
+		for i, body in enumerate(bodies):
+			for body2 in bodies[i:]:
+				if body != body2:
+					body.collide(body2)
+			body.collide(bounds)
+	return run
+
+
+def _quadtree_collision(bodies, bounds):
+	tree = _quadtree(bodies, bounds)
+	return lambda: (bodies.collide_pairs(*tree.collision_pairs(bodies)), bodies.collide_bounds(bounds))
+
+
+def _hash_collision(bodies, bounds):
+	spatialHash = SpatialHash()
+
+	def run():
+		spatialHash.build(bodies.positions, bodies.radii)
+		bodies.collide_pairs(*spatialHash.colliding_pairs())
+		bodies.collide_bounds(bounds)
+	return run
+
+
+def _grid_collision(bodies, bounds):
+	grid = MultiLevelGrid()
+
+	def run():
+		grid.build(bodies.positions, bodies.radii)
+		bodies.collide_pairs(*grid.colliding_pairs())
+		bodies.collide_bounds(bounds)
+	return run
+
+
+def _integration(name):
+	def setup(bodies, bounds):
+		integrator = INTEGRATORS[name]()
+		return lambda: integrator.step(bodies, 1, lambda system, indices=None: None)  # No forces, only the integrator itself is timed
+	return setup
+
+
+_app = None
+
+
+def _drawing(mode):
+	def setup(bodies, bounds):
+		global _app
+		if _app is None:
+			_app = PygameApp((800, 800), 0, "Benchmark", Camera2D(Vector2(0, 0), Vector2(800, 800)))
+		_app.mainCamera.position = Vector2(bounds.x + bounds.width / 2, bounds.y - bounds.height / 2)
+		_app.mainCamera.zoom = 800 / bounds.width  # Everything in view
+
+		if mode == 'lod':
+			tree = _quadtree(bodies, bounds)
+			return lambda: tree.draw_bodies(_app, bodies)
+		if mode == 'per-body':
+			return lambda: [body.draw(_app) for body in bodies]
+		return lambda: bodies.draw(_app)
+	return setup
+
+
+# (phase, solver, largest amount of bodies it is timed for, setup)
+BENCHMARKS = [
+	('build', 'quadtree', 100000, lambda bodies, bounds: lambda: _quadtree(bodies, bounds)),
+	('build', 'linear quadtree', 10 ** 7, lambda bodies, bounds: lambda: LinearQuadTree(bounds, bodies.positions, bodies.masses, bodies.radii, 8)),
+	('build', 'spatial hash', 10 ** 7, lambda bodies, bounds: lambda: SpatialHash().build(bodies.positions, bodies.radii)),
+	('build', 'multi-level grid', 10 ** 7, lambda bodies, bounds: lambda: MultiLevelGrid().build(bodies.positions, bodies.radii)),
+
+	('gravity', 'naive', 1000, _naive_gravity),
+	('gravity', 'direct', 20000, lambda bodies, bounds: lambda: direct_gravity(bodies, 5)),
+	('gravity', 'quadtree', 4000, _quadtree_gravity),
+	('gravity', 'quadtree group', 100000, _group_gravity),
+	('gravity', 'quadtree fused', 100000, _fused_gravity),  # With the collisions found in the same walk
+	('gravity', 'linear quadtree', 10 ** 6, _linear_gravity),
+	('gravity', 'fmm', 10 ** 7, lambda bodies, bounds: lambda: fmm_gravity(bodies, 5)),
+
+	('collision', 'naive', 1000, _naive_collision),
+	('collision', 'quadtree', 100000, _quadtree_collision),
+	('collision', 'spatial hash', 10 ** 7, _hash_collision),
+	('collision', 'multi-level grid', 10 ** 7, _grid_collision),
+	('collision', 'continuous', 10 ** 6, lambda bodies, bounds: lambda: bodies.collide_continuous(1, bounds)),
+
+	('integration', 'euler', 10 ** 7, _integration('euler')),
+	('integration', 'leapfrog', 10 ** 7, _integration('leapfrog')),
+	('integration', 'yoshida4', 10 ** 7, _integration('yoshida4')),
+	('integration', 'rk4', 10 ** 7, _integration('rk4')),
+
+	('drawing', 'per-body', 20000, _drawing('per-body')),
+	('drawing', 'batched', 10 ** 7, _drawing('batched')),
+	('drawing', 'lod', 100000, _drawing('lod')),
+]
+PHASES = ('build', 'gravity', 'collision', 'integration', 'drawing')
+
+
+def measure(function, repeat: int) -> list:
+	"""
+	Time a function a given amount of times.
+
+	:param function: the function to time
+	:param repeat: the amount of times
+	:return: List of the times in seconds
+	"""
+
+	times = []
+	for _ in range(repeat):
+		start = perf_counter()
+		function()
+		times.append(perf_counter() - start)
+	return times
+
+
+def run(scenarios=tuple(SCENARIOS), sizes: dict = None, phases=PHASES, solvers=None, repeat: int = 3, seed: int = 0,
+        output=print) -> list:
+	"""
+	Time every solver of the given phases on every scenario and amount of bodies.
+	Every measurement starts from the same seeded bodies, and solvers are skipped above the amount of bodies they are meant for.
+
+	:param scenarios: names of the scenarios (default: all)
+	:param sizes: amounts of bodies per scenario (default: SIZES)
+	:param phases: names of the phases (default: all)
+	:param solvers: names of the only solvers to time (default: all)
+	:param repeat: the amount of times every measurement is repeated, the fastest counts (default: 3)
+	:param seed: seed of the scenarios (default: 0)
+	:param output: called with every line of the scaling tables (default: print)
+	:return: List of result records
+	"""
+
+	sizes = {**SIZES, **(sizes or {})}
+	results = []
+
+	for scenario in scenarios:
+		for phase in phases:
+			benchmarks = [(solver, maxCount, setup) for p, solver, maxCount, setup in BENCHMARKS if p == phase and (solvers is None or solver in solvers)]
+			if not benchmarks:
+				continue
+
+			counts = sizes[scenario]
+			output(f"\n{scenario} / {phase} (best of {repeat}, ms)")
+			output(f"{'solver':<18}" + ''.join(f"{count:>12}" for count in counts) + f"{'slope':>8}")
+
+			for solver, maxCount, setup in benchmarks:
+				row = []
+				for count in counts:
+					if count > maxCount:
+						row.append(None)
+						continue
+
+					bodies, bounds = SCENARIOS[scenario](count, np.random.default_rng(seed))
+					times = measure(setup(bodies, bounds), repeat)
+					row.append(min(times))
+					results.append({'scenario': scenario, 'phase': phase, 'solver': solver, 'count': count, 'seed': seed,
+					                'best': min(times), 'median': float(np.median(times)), 'times': times})
+
+				# The exponent of the scaling, from the two largest amounts of bodies timed
+				timed = [(count, time) for count, time in zip(counts, row) if time]
+				slope = np.log(timed[-1][1] / timed[-2][1]) / np.log(timed[-1][0] / timed[-2][0]) if len(timed) >= 2 else None
+				output(f"{solver:<18}" + ''.join(f"{time * 1000:>12.2f}" if time is not None else f"{'-':>12}" for time in row) +
+				       (f"{slope:>8.2f}" if slope is not None else f"{'-':>8}"))
+
+	return results
+
+
+if __name__ == '__main__':
+	parser = ArgumentParser(description="Time every solver path on seeded scenarios")
+	parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=['disc', 'gas', 'clustered'], help="the scenarios (default: disc gas clustered)")
+	parser.add_argument('--sizes', nargs='+', type=int, help="the amounts of bodies (default: per scenario)")
+	parser.add_argument('--phases', nargs='+', choices=PHASES, default=PHASES, help="the phases (default: all)")
+	parser.add_argument('--solvers', nargs='+', help="the only solvers to time (default: all)")
+	parser.add_argument('--repeat', type=int, default=3, help="the amount of times every measurement is repeated (default: 3)")
+	parser.add_argument('--seed', type=int, default=0, help="seed of the scenarios (default: 0)")
+	parser.add_argument('--json', metavar='PATH', help="write the results to a JSON file")
+	args = parser.parse_args()
+
+	sizes = {scenario: tuple(args.sizes) for scenario in SCENARIOS} if args.sizes else None
+	results = run(args.scenarios, sizes, args.phases, args.solvers, args.repeat, args.seed)
+
+	if args.json:
+		with open(args.json, 'w') as file:
+			json.dump({'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+			           'cpus': os.cpu_count(), 'results': results}, file, indent=1)
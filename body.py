@@ -1,13 +1,16 @@
 from Engine.Core.app import App
 from Engine.Utils.utils import Colors, Vector2, Rect
+from spatialhash import SpatialHash
 from math import sqrt
 
-from typing import Union, Tuple
+import numpy as np
+from typing import Union, Tuple, Iterable, Optional
 
 
 class Body:
 	"""
 	A class that represents a body in space.
+	The state of the body is stored as a row in a BodySystem, the body itself is only a view into that row.
 
 	Attributes:
 		mass: The mass of the body.
@@ -27,14 +30,80 @@ class Body:
 	"""
 
 	def __init__(self, pos: Vector2, mass: float, vel: Vector2 = None, acc: Vector2 = None, color=Colors.WHITE):
-		self.position = pos
-		self.velocity = vel if vel is not None else Vector2(0, 0)
-		self.acceleration = acc if acc is not None else Vector2(0, 0)
-		self.mass = mass
-		self.size = sqrt(mass)
-		self.heat = 0
+		# A standalone body owns a system of its own until it is moved into a shared BodySystem
+		self._system = BodySystem(capacity=1)
+		self._index = self._system._append(self, pos, mass, vel, acc, color)
 
-		self.color = color
+	@classmethod
+	def _view(cls, system: 'BodySystem', index: int) -> 'Body':
+		body = cls.__new__(cls)
+		body._system = system
+		body._index = index
+		return body
+
+	@property
+	def system(self) -> 'BodySystem':
+		return self._system
+
+	@property
+	def index(self) -> int:
+		return self._index
+
+	@property
+	def position(self) -> Vector2:
+		return Vector2(*self._system._positions[self._index])
+
+	@position.setter
+	def position(self, value: Vector2):
+		self._system._positions[self._index] = value
+
+	@property
+	def velocity(self) -> Vector2:
+		return Vector2(*self._system._velocities[self._index])
+
+	@velocity.setter
+	def velocity(self, value: Vector2):
+		self._system._velocities[self._index] = value
+
+	@property
+	def acceleration(self) -> Vector2:
+		return Vector2(*self._system._accelerations[self._index])
+
+	@acceleration.setter
+	def acceleration(self, value: Vector2):
+		self._system._accelerations[self._index] = value
+
+	@property
+	def mass(self) -> float:
+		return float(self._system._masses[self._index])
+
+	@mass.setter
+	def mass(self, value: float):
+		self._system._masses[self._index] = value
+
+	@property
+	def size(self) -> float:
+		return float(self._system._radii[self._index])
+
+	@size.setter
+	def size(self, value: float):
+		self._system._radii[self._index] = value
+
+	@property
+	def heat(self) -> float:
+		return float(self._system._heat[self._index])
+
+	@heat.setter
+	def heat(self, value: float):
+		self._system._heat[self._index] = value
+
+	@property
+	def color(self) -> tuple:
+		return tuple(self._system._colors[self._index].tolist())
+
+	@color.setter
+	def color(self, value: tuple):
+		self._system._colors[self._index] = value
 
 	def apply_force(self, force: Vector2):
 		"""
@@ -128,30 +197,124 @@ class Body:
 		else:
 			raise TypeError(f"Unhandled type! Expected Body or Rect, got {type(other)}")
 
-	def __continous_collision(self, other: Union['Body', Rect]):
+	def __wall_times(self, other: Rect, velocity: Vector2) -> Tuple[Optional[float], Optional[float]]:
+		"""
+		Calculate when the body reaches the edges of a rectangle it is moving towards, for both axes.
+
+		:param other: rectangle to bounce off
+		:param velocity: the velocity the body moves with
+		:return: Tuple of the times for the x and y axis (0 if already past the edge, None if not moving towards an edge)
+		"""
+
+		left, top, right, bottom = other.x, other.y, other.x + other.width, other.y - other.height
+
+		tx = ty = None
+		if velocity.x != 0:
+			edge = right - self.size if velocity.x > 0 else left + self.size
+			tx = max((edge - self.position.x) / velocity.x, 0)
+		if velocity.y != 0:
+			edge = top - self.size if velocity.y > 0 else bottom + self.size
+			ty = max((edge - self.position.y) / velocity.y, 0)
+
+		return tx, ty
+
+	def time_of_impact(self, other: Union['Body', Rect], dt: float) -> Optional[float]:
+		"""
+		Calculate when the body first touches given object during the next update, assuming both move in straight lines.
+
+		:param other: other body, or rectangle to bounce off the edges of
+		:param dt: time step of the next update
+		:return: Time of the first contact in [0, dt] (0 if already touching), or None if there is no contact
+		"""
+
+		velocity = self.velocity + self.acceleration * dt  # The velocity update() moves the body with
+
+		if isinstance(other, self.__class__):
+			displacement = self.position - other.position
+			vDiff = velocity - (other.velocity + other.acceleration * dt)
+			totSize = self.size + other.size
+
+			# Solve |displacement + vDiff * t| = totSize for the first (entering) root
+			a = vDiff.magnitude_squared()
+			b = 2 * displacement.dot(vDiff)
+			c = displacement.magnitude_squared() - totSize * totSize
+			if c <= 0:
+				return 0.0
+
+			discriminant = b * b - 4 * a * c
+			if a == 0 or b >= 0 or discriminant <= 0:
+				return None  # Not moving towards each other, or passing each other by
+
+			t = (-b - sqrt(discriminant)) / (2 * a)
+			return t if t <= dt else None
+
+		elif isinstance(other, Rect):
+			times = [t for t in self.__wall_times(other, velocity) if t is not None and t <= dt]
+			return min(times) if times else None
+
+		else:
+			raise TypeError(f"Unhandled type! Expected Body or Rect, got {type(other)}")
+
+	def __continous_collision(self, other: Union['Body', Rect], dt: float):
 		"""
 		Perform continous collision between two bodies.
+		The velocities are changed at the time of impact, and the bodies are moved so that update(dt) ends where the new velocities take them after the impact.
 
 		:param other: other body to collide with
+		:param dt: time step of the next update
 		:return: None
 		"""
 
-		pass
+		velocity = self.velocity + self.acceleration * dt
 
-	def collide(self, other: Union['Body', Rect], continuous: bool = False):
+		if isinstance(other, self.__class__):
+			t = self.time_of_impact(other, dt)
+			if t is None:
+				return
+			if t == 0:
+				self.__discrete_collision(other)  # Already overlapping
+				return
+
+			otherVelocity = other.velocity + other.acceleration * dt
+			displacement = (self.position + velocity * t) - (other.position + otherVelocity * t)  # Displacement at the time of impact
+			vDiff = velocity - otherVelocity
+
+			# Elastic collision at the time of impact, see __discrete_collision
+			impulse = 2 / (self.mass + other.mass) * vDiff.dot(displacement) / displacement.magnitude_squared() * displacement
+			self.velocity -= impulse * other.mass
+			self.position += impulse * other.mass * t
+			other.velocity += impulse * self.mass
+			other.position -= impulse * self.mass * t
+
+			# Calculate the heat of the collision using momentum (only for coloring)
+			self.heat += 0.01 * other.mass * other.velocity.magnitude() / self.mass / 10
+			other.heat += 0.01 * self.mass * self.velocity.magnitude() / other.mass / 10
+
+		elif isinstance(other, Rect):
+			tx, ty = self.__wall_times(other, velocity)
+
+			# Mirror the velocity along every axis where the body reaches an edge during the update
+			change = Vector2(-2 * velocity.x if tx is not None and tx <= dt else 0, -2 * velocity.y if ty is not None and ty <= dt else 0)
+			self.velocity += change
+			self.position -= Vector2(change.x * (tx or 0), change.y * (ty or 0))
+
+		else:
+			raise TypeError(f"Unhandled type! Expected Body or Rect, got {type(other)}")
+
+	def collide(self, other: Union['Body', Rect], continuous: bool = False, dt: float = 1):
 		"""
 		Perform collision between two bodies.
 
 		:param other: other body to collide with
 		:param continuous: if true, perform continous collision, else discrete
+		:param dt: time step of the next update, only used by continous collision (default: 1)
 		:return: None
 		"""
 
-		if self.is_colliding(other):
-			if continuous:
-				self.__continous_collision(other)
-			else:
-				self.__discrete_collision(other)
+		if continuous:
+			self.__continous_collision(other, dt)
+		elif self.is_colliding(other):
+			self.__discrete_collision(other)
 
 	def update(self, dt: float):
 		"""
@@ -161,14 +324,7 @@ class Body:
 		:return: None
 		"""
 
-		self.velocity += self.acceleration * dt
-		self.position += self.velocity * dt
-
-		self.acceleration = Vector2(0, 0)  # Reset the acceleration as no force is acting on the body (we don't want to upset Newton)
-		self.heat *= 0.99 * dt  # Reduce the heat of the body
-
-		colorGrade = min(self.heat, 1)  # Clamp to 1
-		self.color = (255 * colorGrade, 255 * (1 - colorGrade), 0)
+		self._system.update(dt, slice(self._index, self._index + 1))
 
 	def draw(self, app: App):
 		"""
@@ -185,3 +341,473 @@ class Body:
 
 	def __repr__(self):
 		return self.__str__()
+
+
+class BodySystem:
+	"""
+	A container storing the state of many bodies in contiguous arrays (structure of arrays).
+	Integration and recoloring are done on whole arrays instead of per body.
+
+	Attributes:
+		positions: (N, 2) array of body positions.
+		velocities: (N, 2) array of body velocities.
+		accelerations: (N, 2) array of body accelerations.
+		masses: (N,) array of body masses.
+		radii: (N,) array of body radii.
+		heat: (N,) array of body heat (only used for coloring).
+		colors: (N, 3) array of body colors.
+
+	Methods:
+		add: Adds a new body to the system.
+		update: Updates all (or a subset of) the bodies.
+		cool: Reduces the heat of all (or a subset of) the bodies.
+		recolor: Recalculates the colors from the heat of the bodies.
+		collide_bounds: Bounces all bodies off the edges of a rectangle.
+		collide_pairs: Resolves the collisions of pairs of bodies.
+		swept_circles: Calculates the circles enclosing the paths of the bodies during the next update.
+		collide_continuous: Resolves the collisions of pairs of bodies and with a rectangle at their time of impact.
+		draw: Draws all bodies.
+	"""
+
+	def __init__(self, bodies: Iterable[Body] = (), capacity: int = 16):
+		self._count = 0
+		self._bodies = []
+
+		self._positions = np.zeros((max(capacity, 1), 2))
+		self._velocities = np.zeros((max(capacity, 1), 2))
+		self._accelerations = np.zeros((max(capacity, 1), 2))
+		self._masses = np.zeros(max(capacity, 1))
+		self._radii = np.zeros(max(capacity, 1))
+		self._heat = np.zeros(max(capacity, 1))
+		self._colors = np.zeros((max(capacity, 1), 3))
+
+		for body in bodies:
+			self.adopt(body)
+
+	@classmethod
+	def from_arrays(cls, positions: np.ndarray, masses: np.ndarray, velocities: np.ndarray = None) -> 'BodySystem':
+		"""
+		Create a system directly from arrays without creating any intermediate bodies.
+
+		:param positions: (N, 2) array of positions
+		:param masses: (N,) array of masses
+		:param velocities: (N, 2) array of velocities (default: zeros)
+		:return: The new BodySystem
+		"""
+
+		count = len(masses)
+		system = cls(capacity=count)
+		system._positions[:count] = positions
+		system._masses[:count] = masses
+		system._radii[:count] = np.sqrt(masses)
+		system._colors[:count] = Colors.WHITE
+		if velocities is not None:
+			system._velocities[:count] = velocities
+
+		system._count = count
+		system._bodies = [Body._view(system, i) for i in range(count)]
+		return system
+
+	def __len__(self):
+		return self._count
+
+	def __iter__(self):
+		return iter(self._bodies)
+
+	def __getitem__(self, index: int) -> Body:
+		return self._bodies[index]
+
+	@property
+	def positions(self) -> np.ndarray:
+		return self._positions[:self._count]
+
+	@positions.setter
+	def positions(self, value: np.ndarray):
+		self._positions[:self._count] = value
+
+	@property
+	def velocities(self) -> np.ndarray:
+		return self._velocities[:self._count]
+
+	@velocities.setter
+	def velocities(self, value: np.ndarray):
+		self._velocities[:self._count] = value
+
+	@property
+	def accelerations(self) -> np.ndarray:
+		return self._accelerations[:self._count]
+
+	@accelerations.setter
+	def accelerations(self, value: np.ndarray):
+		self._accelerations[:self._count] = value
+
+	@property
+	def masses(self) -> np.ndarray:
+		return self._masses[:self._count]
+
+	@property
+	def radii(self) -> np.ndarray:
+		return self._radii[:self._count]
+
+	@property
+	def heat(self) -> np.ndarray:
+		return self._heat[:self._count]
+
+	@property
+	def colors(self) -> np.ndarray:
+		return self._colors[:self._count]
+
+	def _reserve(self, capacity: int):
+		"""
+		Make sure the arrays can hold at least the given amount of bodies.
+
+		:param capacity: the minimum capacity of the arrays
+		:return: None
+		"""
+
+		if capacity <= len(self._masses):
+			return
+
+		capacity = max(capacity, 2 * len(self._masses))  # Grow geometrically to keep appends amortized O(1)
+		for name in ('_positions', '_velocities', '_accelerations', '_masses', '_radii', '_heat', '_colors'):
+			old = getattr(self, name)
+			new = np.zeros((capacity,) + old.shape[1:])
+			new[:self._count] = old[:self._count]
+			setattr(self, name, new)
+
+	def _append(self, body: Body, pos, mass: float, vel=None, acc=None, color=Colors.WHITE, heat: float = 0) -> int:
+		self._reserve(self._count + 1)
+
+		index = self._count
+		self._positions[index] = pos
+		self._velocities[index] = vel if vel is not None else (0, 0)
+		self._accelerations[index] = acc if acc is not None else (0, 0)
+		self._masses[index] = mass
+		self._radii[index] = sqrt(mass)
+		self._heat[index] = heat
+		self._colors[index] = color
+
+		self._count += 1
+		self._bodies.append(body)
+		return index
+
+	def add(self, pos: Vector2, mass: float, vel: Vector2 = None, acc: Vector2 = None, color=Colors.WHITE) -> Body:
+		"""
+		Add a new body to the system.
+
+		:param pos: position of the body
+		:param mass: mass of the body
+		:param vel: velocity of the body (default: zero)
+		:param acc: acceleration of the body (default: zero)
+		:param color: color of the body
+		:return: Body viewing the new row
+		"""
+
+		body = Body._view(self, self._count)
+		self._append(body, pos, mass, vel, acc, color)
+		return body
+
+	def adopt(self, body: Body) -> Body:
+		"""
+		Move an existing body into this system. The body becomes a view into the system afterwards.
+
+		:param body: body to move into the system
+		:return: The same body
+		"""
+
+		old, i = body.system, body.index
+		index = self._append(body, old._positions[i], old._masses[i], old._velocities[i], old._accelerations[i], old._colors[i], old._heat[i])
+		self._radii[index] = old._radii[i]
+
+		body._system = self
+		body._index = index
+		return body
+
+	def update(self, dt: float, indices=slice(None)):
+		"""
+		Update the dynamics of all bodies, or only the given subset.
+
+		:param dt: time since last update
+		:param indices: index array or slice selecting the bodies to update (default: all)
+		:return: None
+		"""
+
+		positions, velocities, accelerations = self.positions, self.velocities, self.accelerations
+
+		velocities[indices] += accelerations[indices] * dt
+		positions[indices] += velocities[indices] * dt
+
+		accelerations[indices] = 0  # Reset the acceleration as no force is acting on the body (we don't want to upset Newton)
+		self.cool(dt, indices)
+
+	def cool(self, dt: float, indices=slice(None)):
+		"""
+		Reduce the heat of all bodies, or only the given subset, and recolor them.
+
+		:param dt: time since last update
+		:param indices: index array or slice selecting the bodies to cool (default: all)
+		:return: None
+		"""
+
+		self.heat[indices] *= 0.99 * dt  # Reduce the heat of the body
+
+		self.recolor(indices)
+
+	def recolor(self, indices=slice(None)):
+		"""
+		Recalculate the colors of the bodies from their heat.
+
+		:param indices: index array or slice selecting the bodies to recolor (default: all)
+		:return: None
+		"""
+
+		colorGrade = np.minimum(self.heat[indices], 1)  # Clamp to 1
+		colors = self.colors
+		colors[indices, 0] = 255 * colorGrade
+		colors[indices, 1] = 255 * (1 - colorGrade)
+		colors[indices, 2] = 0
+
+	def collide_bounds(self, bounds: Rect):
+		"""
+		Bounce all bodies touching the edges of a rectangle, like Body.collide(bounds) but for all bodies at once.
+
+		:param bounds: rectangle to collide with
+		:return: None
+		"""
+
+		positions, radii, velocities = self.positions, self.radii, self.velocities
+		left, top, right, bottom = bounds.x, bounds.y, bounds.x + bounds.width, bounds.y - bounds.height
+
+		# Invert the velocity if the body is colliding with the edge of the rectangle
+		velocities[(positions[:, 0] - radii <= left) | (positions[:, 0] + radii >= right), 0] *= -1
+		velocities[(positions[:, 1] + radii >= top) | (positions[:, 1] - radii <= bottom), 1] *= -1
+
+	def collide_pairs(self, first: np.ndarray, second: np.ndarray):
+		"""
+		Resolve the collisions of touching pairs of bodies, like Body.collide but for many pairs at once.
+		The pairs are resolved in rounds in which no body is in more than one pair, each round as one batch.
+		A pair goes in the first round in which neither of its bodies is taken by an earlier pair, so the result doesn't depend on anything but the order of the pairs.
+
+		:param first: index array of the first body of every pair
+		:param second: index array of the second body of every pair
+		:return: None
+		"""
+
+		first, second = np.asarray(first, dtype=np.int64), np.asarray(second, dtype=np.int64)
+		pair = np.arange(len(first))
+
+		while len(pair):
+			# A pair is in this round if it is the earliest remaining pair of both its bodies
+			earliest = np.full(self._count, len(first))
+			np.minimum.at(earliest, first[pair], pair)
+			np.minimum.at(earliest, second[pair], pair)
+			chosen = (earliest[first[pair]] == pair) & (earliest[second[pair]] == pair)
+
+			self.__discrete_collisions(first[pair[chosen]], second[pair[chosen]])
+			pair = pair[~chosen]
+
+	def __discrete_collisions(self, i: np.ndarray, j: np.ndarray):
+		"""
+		Perform discrete collision between pairs of bodies where no body is in more than one pair, see Body.__discrete_collision.
+
+		:param i: index array of the first body of every pair
+		:param j: index array of the second body of every pair
+		:return: None
+		"""
+
+		positions, velocities, masses, radii, heat = self.positions, self.velocities, self.masses, self.radii, self.heat
+
+		displacement = positions[i] - positions[j]
+		d = np.sqrt(np.einsum('ij,ij->i', displacement, displacement))
+
+		# Only bodies that are still touching collide, bodies at the same position have no direction to separate in
+		colliding = (d <= radii[i] + radii[j]) & (d > 0)
+		i, j, displacement, d = i[colliding], j[colliding], displacement[colliding], d[colliding]
+
+		# Make sure the bodies don't overlap by moving them apart based on their mass
+		intersectionDistance = displacement * ((radii[i] + radii[j] - d) / d)[:, None]
+		inverseMass = 1 / masses[i]
+		inverseMassOther = 1 / masses[j]
+
+		positions[i] += intersectionDistance * (inverseMass / (inverseMass + inverseMassOther))[:, None]
+		positions[j] -= intersectionDistance * (inverseMassOther / (inverseMass + inverseMassOther))[:, None]
+
+		vDiff = velocities[i] - velocities[j]
+		approaching = np.einsum('ij,ij->i', vDiff, displacement) / d <= 0.0  # Bodies moving apart don't collide
+		i, j, vDiff = i[approaching], j[approaching], vDiff[approaching]
+
+		# Calculate the new velocities using conservation of momentum and kinetic energy (elastic collisions)
+		displacement = positions[i] - positions[j]  # Update displacement as we have moved the bodies
+		impulse = (2 / (masses[i] + masses[j]) * np.einsum('ij,ij->i', vDiff, displacement) / np.einsum('ij,ij->i', displacement, displacement))[:, None] * displacement
+		velocities[i] -= impulse * masses[j, None]
+		velocities[j] += impulse * masses[i, None]
+
+		# Calculate the heat of the collision using momentum (only for coloring)
+		heat[i] += 0.01 * masses[j] * np.linalg.norm(velocities[j], axis=1) / masses[i] / 10
+		heat[j] += 0.01 * masses[i] * np.linalg.norm(velocities[i], axis=1) / masses[j] / 10
+
+	def swept_circles(self, dt: float, start: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+		"""
+		Calculate the circles enclosing the path of every body during the next update, used to find candidate pairs for continuous collision.
+
+		:param dt: time step of the next update
+		:param start: (N,) array of the times from which the paths are needed (default: zeros)
+		:return: Tuple of (N, 2) centers and (N,) radii
+		"""
+
+		start = np.zeros(self._count) if start is None else start
+		velocities = self.velocities + self.accelerations * dt  # The velocity update() moves the bodies with
+		return self.positions + velocities * ((start + dt) / 2)[:, None], self.radii + np.linalg.norm(velocities, axis=1) * (dt - start) / 2
+
+	def collide_continuous(self, dt: float, bounds: Rect = None, maxSubsteps: int = 16, maxPasses: int = 4):
+		"""
+		Resolve the collisions between the bodies, and with the edges of a rectangle, at the time they happen during the next update.
+		Bodies that already overlap are resolved like collide_pairs. Then the impacts are resolved in sub-steps ordered by time,
+		each sub-step resolving every impact that is the earliest one of all its bodies.
+		Bodies whose velocity changed get new candidate pairs from their remaining path in another pass, impacts left after that are caught as overlaps next update.
+		The velocities are changed at the time of impact, and the bodies are moved so that update(dt) ends where the new velocities take them after the impact.
+
+		:param dt: time step of the next update
+		:param bounds: rectangle to bounce off the edges of (default: None)
+		:param maxSubsteps: the maximum amount of sub-steps per pass (default: 16)
+		:param maxPasses: the maximum amount of passes (default: 4)
+		:return: None
+		"""
+
+		spatialHash = SpatialHash()
+		spatialHash.build(*self.swept_circles(dt))
+		first, second = spatialHash.colliding_pairs()
+		self.collide_pairs(first, second)
+
+		effective = self.velocities + self.accelerations * dt  # The velocity update() moves the bodies with
+		start = np.zeros(self._count)  # The time of the last impact of every body, its path is only valid after it
+
+		for _ in range(maxPasses):
+			changed = self.__sweep(dt, first, second, bounds, effective, start, maxSubsteps)
+			if not changed.any():
+				break
+
+			spatialHash.build(*self.swept_circles(dt, start))
+			first, second = spatialHash.colliding_pairs()
+			keep = changed[first] | changed[second]  # Pairs of unchanged bodies have been swept already
+			first, second = first[keep], second[keep]
+
+	def __sweep(self, dt: float, first: np.ndarray, second: np.ndarray, bounds: Rect, effective: np.ndarray, start: np.ndarray,
+	            maxSubsteps: int) -> np.ndarray:
+		"""
+		Resolve the impacts of candidate pairs, and with the edges of a rectangle, in sub-steps ordered by time, see collide_continuous.
+
+		:param dt: time step of the next update
+		:param first: index array of the first body of every candidate pair
+		:param second: index array of the second body of every candidate pair
+		:param bounds: rectangle to bounce off the edges of, or None
+		:param effective: (N, 2) array of the velocities update() moves the bodies with, updated in place
+		:param start: (N,) array of the times of the last impact of every body, updated in place
+		:param maxSubsteps: the maximum amount of sub-steps
+		:return: (N,) boolean array of the bodies whose velocity changed
+		"""
+
+		positions, velocities, masses, radii, heat = self.positions, self.velocities, self.masses, self.radii, self.heat
+		changed = np.zeros(self._count, dtype=bool)
+
+		# Only pairs and bodies with an impact ahead, or with a body that just changed velocity, can have an impact in the next sub-step
+		pairs = np.arange(len(first))
+		walls = np.arange(self._count) if bounds is not None else np.zeros(0, dtype=np.int64)
+
+		for _ in range(maxSubsteps):
+			i, j = first[pairs], second[pairs]
+
+			# First (entering) root of |displacement + vDiff * t| = totSize
+			displacement = positions[i] - positions[j]
+			vDiff = effective[i] - effective[j]
+			totSize = radii[i] + radii[j]
+			a = np.einsum('ij,ij->i', vDiff, vDiff)
+			b = 2 * np.einsum('ij,ij->i', displacement, vDiff)
+			c = np.einsum('ij,ij->i', displacement, displacement) - totSize * totSize
+			discriminant = b * b - 4 * a * c
+
+			pairTime = np.full(len(pairs), np.inf)
+			hit = (a > 0) & (discriminant > 0)
+			pairTime[hit] = (-b[hit] - np.sqrt(discriminant[hit])) / (2 * a[hit])
+			pairTime[(pairTime < np.maximum(start[i], start[j])) | (pairTime > dt)] = np.inf
+
+			# Time until the edge a body is moving towards is reached (immediately if it is already past it)
+			edgeTime = np.full((len(walls), 2), np.inf)
+			if len(walls):
+				low = np.array([bounds.x, bounds.y - bounds.height]) + radii[walls, None]
+				high = np.array([bounds.x + bounds.width, bounds.y]) - radii[walls, None]
+				velocity = effective[walls]
+				moving = velocity != 0
+				edge = np.where(velocity > 0, high, low)
+				edgeTime[moving] = np.maximum((edge[moving] - positions[walls][moving]) / velocity[moving], np.repeat(start[walls, None], 2, axis=1)[moving])
+				edgeTime[edgeTime > dt] = np.inf
+
+			times = np.concatenate((pairTime, edgeTime[:, 0], edgeTime[:, 1]))
+			if not np.isfinite(times).any():
+				break
+
+			# An impact is resolved in this sub-step if it is the earliest (then lowest numbered) impact of all its bodies
+			events = np.arange(len(times))
+			bodies = (np.concatenate((i, walls, walls)), np.concatenate((j, walls, walls)))
+			earliest = np.full(self._count, np.inf)
+			np.minimum.at(earliest, bodies[0], times)
+			np.minimum.at(earliest, bodies[1], times)
+			candidate = np.isfinite(times) & (times == earliest[bodies[0]]) & (times == earliest[bodies[1]])
+
+			lowest = np.full(self._count, len(events))
+			np.minimum.at(lowest, bodies[0][candidate], events[candidate])
+			np.minimum.at(lowest, bodies[1][candidate], events[candidate])
+			chosen = candidate & (lowest[bodies[0]] == events) & (lowest[bodies[1]] == events)
+			moved = np.zeros(self._count, dtype=bool)
+
+			# Elastic collisions at the time of impact, see __discrete_collisions
+			pair = np.flatnonzero(chosen[:len(pairs)])
+			k, l, t = i[pair], j[pair], pairTime[pair]
+			displacement = positions[k] - positions[l] + (effective[k] - effective[l]) * t[:, None]
+			vDiff = effective[k] - effective[l]
+			impulse = (2 / (masses[k] + masses[l]) * np.einsum('ij,ij->i', vDiff, displacement) / np.einsum('ij,ij->i', displacement, displacement))[:, None] * displacement
+
+			for index, change in ((k, -impulse * masses[l, None]), (l, impulse * masses[k, None])):
+				velocities[index] += change
+				effective[index] += change
+				positions[index] -= change * t[:, None]
+				start[index] = t
+				moved[index] = True
+
+			# Calculate the heat of the collision using momentum (only for coloring)
+			heat[k] += 0.01 * masses[l] * np.linalg.norm(velocities[l], axis=1) / masses[k] / 10
+			heat[l] += 0.01 * masses[k] * np.linalg.norm(velocities[k], axis=1) / masses[l] / 10
+
+			# Mirror the velocity along the axis of the reached edge
+			for axis in range(2):
+				wall = np.flatnonzero(chosen[len(pairs) + axis * len(walls):len(pairs) + (axis + 1) * len(walls)])
+				index, t = walls[wall], edgeTime[wall, axis]
+				change = -2 * effective[index, axis]
+				velocities[index, axis] += change
+				effective[index, axis] += change
+				positions[index, axis] -= change * t
+				start[index] = t
+				moved[index] = True
+
+			changed |= moved
+			pairs = pairs[np.isfinite(pairTime) | moved[i] | moved[j]]
+			walls = walls[np.isfinite(edgeTime).any(axis=1) | moved[walls]]
+
+		return changed
+
+	def draw(self, app: App, positions: np.ndarray = None):
+		"""
+		Draw all bodies in given application in one batch, see App.draw_circles.
+
+		:param app: app to draw the bodies in
+		:param positions: (N, 2) array of positions to draw the bodies at, e.g. interpolated between two updates (default: their positions)
+		:return: None
+		"""
+
+		app.draw_circles(self.positions if positions is None else positions, self.radii, self.colors, fromCamera=True)
+
+	def __str__(self):
+		return f"BodySystem(bodies={self._count})"
+
+	def __repr__(self):
+		return self.__str__()
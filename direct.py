@@ -0,0 +1,56 @@
+from body import BodySystem
+
+import numpy as np
+
+
+def direct_accelerations(positions: np.ndarray, masses: np.ndarray, radii: np.ndarray, g: float = 5.0, targets: np.ndarray = None,
+                         tileSize: int = 256) -> np.ndarray:
+	"""
+	Calculate the exact gravitational acceleration of bodies by summing over all pairs (O(N^2)).
+	The pairs are processed in tiles of tileSize x tileSize so memory use stays bounded for large N.
+	Uses the same softening as Body.gravitational_force, i.e. the distance is never smaller than the sum of the radii.
+
+	:param positions: (N, 2) array of body positions
+	:param masses: (N,) array of body masses
+	:param radii: (N,) array of body radii
+	:param g: gravitational constant (default: 5)
+	:param targets: indices of the bodies to calculate the acceleration for (default: all bodies)
+	:param tileSize: the amount of targets and sources processed at once (default: 256)
+	:return: (len(targets), 2) array of accelerations
+	"""
+
+	targets = np.arange(len(masses)) if targets is None else np.asarray(targets)
+	accelerations = np.zeros((len(targets), 2))
+
+	for t in range(0, len(targets), tileSize):
+		tile = targets[t:t + tileSize]
+		tx, ty, tr = positions[tile, 0, None], positions[tile, 1, None], radii[tile, None]
+
+		for s in range(0, len(masses), tileSize):
+			dx = positions[None, s:s + tileSize, 0] - tx
+			dy = positions[None, s:s + tileSize, 1] - ty
+			distSquared = dx * dx + dy * dy
+
+			minDist = tr + radii[None, s:s + tileSize]  # Minimum distance between bodies is the sum of their radii
+			denominator = np.maximum(distSquared, minDist * minDist) * np.sqrt(distSquared)
+
+			# Bodies at the same position (including the body itself) do not pull on each other
+			scale = np.divide(g * masses[None, s:s + tileSize], denominator, out=np.zeros_like(denominator), where=distSquared > 0)
+
+			accelerations[t:t + tileSize, 0] += (scale * dx).sum(axis=1)
+			accelerations[t:t + tileSize, 1] += (scale * dy).sum(axis=1)
+
+	return accelerations
+
+
+def direct_gravity(bodies: BodySystem, g: float = 5.0, tileSize: int = 256) -> None:
+	"""
+	Apply the exact gravitational acceleration between all bodies in the system.
+
+	:param bodies: system of bodies to apply gravity to
+	:param g: gravitational constant (default: 5)
+	:param tileSize: the amount of targets and sources processed at once (default: 256)
+	:return: None
+	"""
+
+	bodies.accelerations += direct_accelerations(bodies.positions, bodies.masses, bodies.radii, g, tileSize=tileSize)
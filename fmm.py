@@ -0,0 +1,263 @@
+from body import BodySystem
+
+from functools import lru_cache
+from math import ceil, log
+
+import numpy as np
+
+
+def _binomial(x: float, k: int) -> float:
+	"""
+	Generalized binomial coefficient (x choose k) for any real x.
+
+	:param x: the upper argument
+	:param k: the lower argument
+	:return: The binomial coefficient
+	"""
+
+	result = 1.0
+	for i in range(k):
+		result *= (x - i) / (i + 1)
+	return result
+
+
+def _ranks(counts: np.ndarray) -> np.ndarray:
+	"""
+	Create the ranks 0..count-1 for every count, concatenated.
+
+	:param counts: array of counts
+	:return: array of ranks
+	"""
+
+	return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+
+@lru_cache(maxsize=None)
+def _terms(order: int):
+	"""
+	Get the terms of an expansion of given order: every (j, k) with j + k <= order stands for z^j * conj(z)^k.
+
+	:param order: the order of the expansion
+	:return: Tuple of the j and k of every term
+	"""
+
+	terms = [(j, k) for j in range(order + 1) for k in range(order + 1 - j)]
+	return np.array([j for j, _ in terms]), np.array([k for _, k in terms])
+
+
+@lru_cache(maxsize=None)
+def _shift(order: int, level: int, quadrant: int) -> np.ndarray:
+	"""
+	Get the matrix moving an expansion between a parent at level - 1 and its child at level in the given quadrant.
+	Multipoles are moved up with moments @ shift, locals are moved down with locals @ shift.T (both are exact).
+
+	:param order: the order of the expansions
+	:param level: the level of the child
+	:param quadrant: the quadrant of the child (bit 0: right, bit 1: top)
+	:return: (terms, terms) matrix
+	"""
+
+	J, K = _terms(order)
+	width = 0.5 ** level
+	d = complex((quadrant & 1) - 0.5, (quadrant >> 1) - 0.5) * width  # Child center relative to the parent center
+
+	shift = np.zeros((len(J), len(J)), dtype=complex)
+	for row, (i, j) in enumerate(zip(J, K)):  # Child term
+		for column, (a, b) in enumerate(zip(J, K)):  # Parent term
+			if i <= a and j <= b:
+				shift[row, column] = _binomial(a, i) * _binomial(b, j) * d ** (a - i) * d.conjugate() ** (b - j)
+
+	return shift
+
+
+@lru_cache(maxsize=None)
+def _multipole_to_local_coefficients(order: int) -> np.ndarray:
+	"""
+	Get the constant part of the multipole to local matrices, the coefficients of the series of z^(-1/2) and conj(z)^(-1/2).
+
+	:param order: the order of the expansions
+	:return: (terms, terms) matrix with the multipole terms (j, k) as rows and the local terms (a, b) as columns
+	"""
+
+	J, K = _terms(order)
+	return np.array([[_binomial(-0.5, j) * _binomial(-0.5, k) * (-1) ** (j + k) * _binomial(-j - 0.5, a) * _binomial(-k - 0.5, b)
+	                  for a, b in zip(J, K)] for j, k in zip(J, K)])
+
+
+@lru_cache(maxsize=None)
+def _multipole_to_local(order: int, level: int, dx: int, dy: int) -> np.ndarray:
+	"""
+	Get the matrix turning the multipole of a box into a local expansion of the box (dx, dy) boxes away from it.
+	Uses 1 / |z| = z^(-1/2) * conj(z)^(-1/2), so both factors expand as ordinary complex power series.
+
+	:param order: the order of the expansions
+	:param level: the level of the boxes
+	:param dx: column of the source box relative to the target box
+	:param dy: row of the source box relative to the target box
+	:return: (terms, terms) matrix, locals = moments @ matrix
+	"""
+
+	J, K = _terms(order)
+	z = -complex(dx, dy) * 0.5 ** level  # Target center relative to the source center
+
+	powers = -(J[:, None] + J[None, :]).astype(float)
+	conjugatePowers = -(K[:, None] + K[None, :]).astype(float)
+	return _multipole_to_local_coefficients(order) * z ** powers * z.conjugate() ** conjugatePowers / abs(z)
+
+
+def _interaction_offsets(column: int, row: int) -> list:
+	"""
+	Get the offsets of the boxes in the interaction list of a box: children of the parent's neighbours that are not adjacent to the box.
+
+	:param column: parity of the column of the box
+	:param row: parity of the row of the box
+	:return: List of (dx, dy) offsets
+	"""
+
+	offsets = range(-2, 4)
+	return [(dx - column, dy - row) for dy in offsets for dx in offsets if abs(dx - column) > 1 or abs(dy - row) > 1]
+
+
+def fmm_accelerations(positions: np.ndarray, masses: np.ndarray, radii: np.ndarray, g: float = 5.0, order: int = 6,
+                      leafCapacity: int = 16, maxDepth: int = 9, chunkSize: int = 1 << 22) -> np.ndarray:
+	"""
+	Calculate the gravitational acceleration of all bodies using the Fast Multipole Method (O(N)).
+	Bodies are binned into a uniform grid of boxes, multipoles are moved up the levels, turned into local expansions of
+	well separated boxes and moved back down. Neighbouring boxes interact directly with the same softening as direct_accelerations.
+
+	:param positions: (N, 2) array of body positions
+	:param masses: (N,) array of body masses
+	:param radii: (N,) array of body radii
+	:param g: gravitational constant (default: 5)
+	:param order: the order of the multipole and local expansions, higher is more accurate (default: 6)
+	:param leafCapacity: the average amount of bodies in a leaf box the grid is sized for (default: 16)
+	:param maxDepth: the maximum depth of the grid, leaves at this depth hold any amount of bodies (default: 9)
+	:param chunkSize: the amount of body pairs processed at once by the direct interactions (default: 2^22)
+	:return: (N, 2) array of accelerations
+	"""
+
+	positions = np.asarray(positions, dtype=float)
+	masses = np.asarray(masses, dtype=float)
+	radii = np.asarray(radii, dtype=float)
+
+	count = len(masses)
+	accelerations = np.zeros((count, 2))
+	if count == 0:
+		return accelerations
+
+	# Work in the unit square so the translation matrices only depend on the level and can be cached
+	low = positions.min(axis=0)
+	size = max(float(np.ptp(positions, axis=0).max()), 1e-12) * (1 + 1e-9)
+	unit = (positions - low) / size
+	unitRadii = radii / size
+
+	depth = min(max(ceil(log(max(count / leafCapacity, 1), 4)), 0), maxDepth)
+	boxes = 1 << depth
+
+	column = np.minimum((unit[:, 0] * boxes).astype(np.int64), boxes - 1)
+	row = np.minimum((unit[:, 1] * boxes).astype(np.int64), boxes - 1)
+	box = row * boxes + column
+
+	# Far field, there are no well separated boxes above level 2
+	if depth >= 2:
+		J, K = _terms(order)
+		center = ((column + 0.5) + 1j * (row + 0.5)) / boxes
+		offset = unit[:, 0] + 1j * unit[:, 1] - center
+		powers = [np.ones(count, dtype=complex)]
+		for _ in range(order):
+			powers.append(powers[-1] * offset)
+		conjugates = [power.conjugate() for power in powers]
+
+		# Particle to multipole at the leaves
+		moments = np.zeros((boxes * boxes, len(J)), dtype=complex)
+		for t, (j, k) in enumerate(zip(J, K)):
+			weights = masses * powers[j] * conjugates[k]
+			moments[:, t] = np.bincount(box, weights.real, boxes * boxes) + 1j * np.bincount(box, weights.imag, boxes * boxes)
+
+		# Multipole to multipole, up to level 2
+		multipoles = {depth: moments.reshape(boxes, boxes, len(J))}
+		for level in range(depth, 2, -1):
+			child = multipoles[level]
+			multipoles[level - 1] = sum(child[quadrant >> 1::2, quadrant & 1::2] @ _shift(order, level, quadrant) for quadrant in range(4))
+
+		# Multipole to local for the interaction lists, and local to local down to the leaves
+		local = None
+		for level in range(2, depth + 1):
+			n = 1 << level
+			padded = np.pad(multipoles[level], ((3, 3), (3, 3), (0, 0)))
+
+			parent, local = local, np.zeros((n, n, len(J)), dtype=complex)
+			if parent is not None:
+				for quadrant in range(4):
+					local[quadrant >> 1::2, quadrant & 1::2] = parent @ _shift(order, level, quadrant).T
+
+			for y in range(2):
+				for x in range(2):
+					for dx, dy in _interaction_offsets(x, y):
+						sources = padded[3 + y + dy:3 + y + dy + n:2, 3 + x + dx:3 + x + dx + n:2]
+						local[y::2, x::2] += sources @ _multipole_to_local(order, level, dx, dy)
+
+		# Local to particle, the acceleration is 2 * d(potential) / d(conj(z))
+		local = local.reshape(boxes * boxes, len(J))
+		field = np.zeros(count, dtype=complex)
+		for t, (j, k) in enumerate(zip(J, K)):
+			if k > 0:
+				field += k * local[box, t] * powers[j] * conjugates[k - 1]
+
+		accelerations[:, 0] += 2 * g * field.real
+		accelerations[:, 1] += 2 * g * field.imag
+
+	# Near field, every body interacts directly with the bodies in its own and the 8 neighbouring leaves
+	sort = np.argsort(box, kind='stable')
+	boxCount = np.bincount(box, minlength=boxes * boxes)
+	boxStart = np.cumsum(boxCount) - boxCount
+
+	targets, starts, counts = [], [], []
+	for dy in (-1, 0, 1):
+		for dx in (-1, 0, 1):
+			valid = np.flatnonzero((0 <= column + dx) & (column + dx < boxes) & (0 <= row + dy) & (row + dy < boxes))
+			neighbour = box[valid] + dy * boxes + dx
+			targets.append(valid)
+			starts.append(boxStart[neighbour])
+			counts.append(boxCount[neighbour])
+
+	targets, starts, counts = np.concatenate(targets), np.concatenate(starts), np.concatenate(counts)
+
+	ax, ay = np.zeros(count), np.zeros(count)
+	cumulative = np.cumsum(counts)
+	splits = np.concatenate(([0], np.searchsorted(cumulative, np.arange(chunkSize, cumulative[-1], chunkSize)), [len(counts)]))
+	for first, last in zip(splits[:-1], splits[1:]):
+		chunkCounts = counts[first:last]
+		target = np.repeat(targets[first:last], chunkCounts)
+		source = sort[np.repeat(starts[first:last], chunkCounts) + _ranks(chunkCounts)]
+
+		dx = unit[source, 0] - unit[target, 0]
+		dy = unit[source, 1] - unit[target, 1]
+		distSquared = dx * dx + dy * dy
+		minDist = unitRadii[source] + unitRadii[target]
+		denominator = np.maximum(distSquared, minDist * minDist) * np.sqrt(distSquared)
+
+		# Bodies at the same position (including the body itself) do not pull on each other
+		scale = np.divide(g * masses[source], denominator, out=np.zeros_like(denominator), where=distSquared > 0)
+		ax += np.bincount(target, scale * dx, count)
+		ay += np.bincount(target, scale * dy, count)
+
+	accelerations[:, 0] += ax
+	accelerations[:, 1] += ay
+
+	return accelerations / (size * size)  # Back from the unit square
+
+
+def fmm_gravity(bodies: BodySystem, g: float = 5.0, order: int = 6, leafCapacity: int = 16, maxDepth: int = 9) -> None:
+	"""
+	Apply gravity between all bodies in the system using the Fast Multipole Method.
+
+	:param bodies: system of bodies to apply gravity to
+	:param g: gravitational constant (default: 5)
+	:param order: the order of the multipole and local expansions, higher is more accurate (default: 6)
+	:param leafCapacity: the average amount of bodies in a leaf box the grid is sized for (default: 16)
+	:param maxDepth: the maximum depth of the grid (default: 9)
+	:return: None
+	"""
+
+	bodies.accelerations += fmm_accelerations(bodies.positions, bodies.masses, bodies.radii, g, order, leafCapacity, maxDepth)
@@ -0,0 +1,289 @@
+from body import BodySystem
+
+from abc import ABC, abstractmethod
+from typing import Callable
+
+import numpy as np
+
+
+class Integrator(ABC):
+	"""
+	Abstract class for integrators advancing the positions and velocities of a whole system of bodies one time step.
+	Forces are evaluated by a callback filling in bodies.accelerations for the current bodies.positions (like direct_gravity or
+	QuadTree.group_gravity), so every integrator works with every gravity solver.
+
+	Attributes:
+		order: The order of accuracy of the integrator.
+		evaluations: The amount of force evaluations per step.
+
+	Methods:
+		step: Advances a system of bodies one time step.
+		reset: Forgets the state kept between steps.
+		state: Gets the settings and the state kept between steps, e.g. for a checkpoint.
+		load_state: Restores the settings and the state kept between steps.
+	"""
+
+	order = 1
+	evaluations = 1
+
+	@staticmethod
+	def _accelerations(bodies: BodySystem, accelerate: Callable[..., None], indices: np.ndarray = None) -> np.ndarray:
+		"""
+		Evaluate the accelerations of the bodies at their current positions.
+
+		:param bodies: system of bodies
+		:param accelerate: callback adding the accelerations of the bodies to bodies.accelerations
+		:param indices: index array of the only bodies to evaluate, passed on to accelerate (default: all bodies)
+		:return: (N, 2) array of accelerations, or (len(indices), 2) if indices are given
+		"""
+
+		bodies.accelerations = 0
+		if indices is None:
+			accelerate(bodies)
+			return bodies.accelerations.copy()
+
+		accelerate(bodies, indices)
+		return bodies.accelerations[indices]
+
+	def reset(self):
+		"""
+		Forget the state kept between steps, e.g. after bodies were added or moved by hand.
+
+		:return: None
+		"""
+
+		pass
+
+	def state(self) -> dict:
+		"""
+		Get the settings and the state kept between steps (all instance attributes).
+
+		:return: Dictionary of attribute names to numbers, arrays or None
+		"""
+
+		return dict(vars(self))
+
+	def load_state(self, state: dict):
+		"""
+		Restore the settings and the state kept between steps from Integrator.state.
+
+		:param state: dictionary of attribute names to numbers, arrays or None
+		:return: None
+		"""
+
+		for name, value in state.items():
+			setattr(self, name, value)
+
+	@abstractmethod
+	def step(self, bodies: BodySystem, dt: float, accelerate: Callable[[BodySystem], None]):
+		"""
+		Advance the bodies one time step.
+
+		:param bodies: system of bodies to advance
+		:param dt: the time step
+		:param accelerate: callback adding the accelerations of the bodies to bodies.accelerations
+		:return: None
+		"""
+
+		pass
+
+
+class Euler(Integrator):
+	"""
+	Semi-implicit (symplectic) Euler, the original BodySystem.update: kick with the current forces, then drift.
+	Forces already added to bodies.accelerations before the step are kept.
+	"""
+
+	order = 1
+	evaluations = 1
+
+	def step(self, bodies: BodySystem, dt: float, accelerate: Callable[[BodySystem], None]):
+		accelerate(bodies)
+		bodies.update(dt)
+
+
+class Leapfrog(Integrator):
+	"""
+	Leapfrog in kick-drift-kick form (velocity Verlet), symplectic and second order.
+	The forces at the end of a step are reused at the start of the next one, so it costs one force evaluation per step
+	unless the positions were changed between the steps (e.g. by collisions).
+	"""
+
+	order = 2
+	evaluations = 1
+
+	def __init__(self):
+		self.__positions = None  # Positions the cached accelerations were evaluated at
+		self.__accelerations = None
+
+	def reset(self):
+		self.__positions = None
+		self.__accelerations = None
+
+	def step(self, bodies: BodySystem, dt: float, accelerate: Callable[[BodySystem], None]):
+		positions, velocities = bodies.positions, bodies.velocities
+
+		if self.__positions is None or self.__positions.shape != positions.shape or not np.array_equal(self.__positions, positions):
+			self.__accelerations = self._accelerations(bodies, accelerate)
+
+		velocities += self.__accelerations * (dt / 2)
+		positions += velocities * dt
+		self.__accelerations = self._accelerations(bodies, accelerate)
+		velocities += self.__accelerations * (dt / 2)
+
+		self.__positions = positions.copy()
+		bodies.accelerations = 0
+		bodies.cool(dt)
+
+
+VelocityVerlet = Leapfrog
+
+
+class Yoshida4(Integrator):
+	"""
+	Yoshida's fourth order symplectic integrator: three leapfrog steps of sizes w1, w0, w1 (drift-kick-drift form).
+	"""
+
+	order = 4
+	evaluations = 3
+
+	W1 = 1 / (2 - 2 ** (1 / 3))
+	W0 = -2 ** (1 / 3) / (2 - 2 ** (1 / 3))
+	DRIFTS = (W1 / 2, (W0 + W1) / 2, (W0 + W1) / 2, W1 / 2)
+	KICKS = (W1, W0, W1)
+
+	def step(self, bodies: BodySystem, dt: float, accelerate: Callable[[BodySystem], None]):
+		positions, velocities = bodies.positions, bodies.velocities
+
+		for drift, kick in zip(self.DRIFTS, self.KICKS):
+			positions += velocities * (drift * dt)
+			velocities += self._accelerations(bodies, accelerate) * (kick * dt)
+		positions += velocities * (self.DRIFTS[-1] * dt)
+
+		bodies.accelerations = 0
+		bodies.cool(dt)
+
+
+class RK4(Integrator):
+	"""
+	The classical fourth order Runge-Kutta method, accurate but not symplectic (energy slowly drifts over long runs).
+	"""
+
+	order = 4
+	evaluations = 4
+
+	def step(self, bodies: BodySystem, dt: float, accelerate: Callable[[BodySystem], None]):
+		positions, velocities = bodies.positions, bodies.velocities
+		startPositions, startVelocities = positions.copy(), velocities.copy()
+
+		# Velocity and acceleration at the start, twice at the middle and at the end of the step
+		slopes = [(startVelocities, self._accelerations(bodies, accelerate))]
+		for fraction in (0.5, 0.5, 1):
+			velocity, acceleration = slopes[-1]
+			positions[...] = startPositions + velocity * (fraction * dt)
+			slopes.append((startVelocities + acceleration * (fraction * dt), self._accelerations(bodies, accelerate)))
+
+		weights = (1, 2, 2, 1)
+		positions[...] = startPositions + sum(w * velocity for w, (velocity, _) in zip(weights, slopes)) * (dt / 6)
+		velocities[...] = startVelocities + sum(w * acceleration for w, (_, acceleration) in zip(weights, slopes)) * (dt / 6)
+
+		bodies.accelerations = 0
+		bodies.cool(dt)
+
+
+class BlockLeapfrog(Integrator):
+	"""
+	Leapfrog (kick-drift-kick) with hierarchical block time steps: every body steps with dt / 2^level of its own.
+	The level of a body follows from its acceleration, dt_i = eta * max(|v| / |a|, sqrt(radius / |a|)), so only bodies in close
+	encounters or tight orbits take small steps. All bodies drift together every smallest step, but only the bodies at the end of their step
+	get their forces evaluated and are kicked. The accelerate callback must accept an index array of the bodies to evaluate,
+	e.g. Simulation.accelerate passing it on to QuadTree.group_gravity.
+
+	Attributes:
+		maxLevel: The deepest level, the smallest step is dt / 2^maxLevel.
+		eta: The accuracy parameter of the step criterion, smaller is more accurate.
+		levels: The level of every body.
+		evaluations: The average amount of force evaluations per body in the last step.
+	"""
+
+	order = 2
+
+	def __init__(self, maxLevel: int = 5, eta: float = 0.02):
+		self.maxLevel = maxLevel
+		self.eta = eta
+		self.levels = None
+		self.evaluations = 1
+		self.__positions = None  # Positions the cached accelerations were evaluated at
+		self.__accelerations = None
+
+	def reset(self):
+		self.levels = None
+		self.__positions = None
+		self.__accelerations = None
+
+	def __desired_levels(self, accelerations: np.ndarray, velocities: np.ndarray, radii: np.ndarray, dt: float) -> np.ndarray:
+		"""
+		Get the level whose step satisfies the step criterion of every body.
+
+		:param accelerations: (k, 2) array of accelerations
+		:param velocities: (k, 2) array of velocities
+		:param radii: (k,) array of radii
+		:param dt: the largest step
+		:return: (k,) array of levels
+		"""
+
+		magnitude = np.sqrt(np.einsum('ij,ij->i', accelerations, accelerations))
+		speed = np.sqrt(np.einsum('ij,ij->i', velocities, velocities))
+		timeScale = np.maximum(speed, np.sqrt(radii * magnitude))  # max(|v| / |a|, sqrt(radius / |a|)) times |a|
+		steps = self.eta * np.divide(timeScale, magnitude, out=np.full_like(magnitude, np.inf), where=magnitude > 0)
+		with np.errstate(divide='ignore'):
+			levels = np.ceil(np.log2(dt / steps))
+		return np.clip(levels, 0, self.maxLevel).astype(np.int64)
+
+	def step(self, bodies: BodySystem, dt: float, accelerate: Callable[..., None]):
+		positions, velocities, radii = bodies.positions, bodies.velocities, bodies.radii
+		substeps = 1 << self.maxLevel
+		h = dt / substeps
+
+		# Bodies moved since the last step (e.g. separated by collisions) get new forces, all of them after bodies were added
+		if self.__positions is None or self.__positions.shape != positions.shape:
+			self.__accelerations = self._accelerations(bodies, accelerate)
+			evaluated = len(bodies)
+		else:
+			moved = np.flatnonzero((self.__positions != positions).any(axis=1))
+			if len(moved):
+				self.__accelerations[moved] = self._accelerations(bodies, accelerate, moved)
+			evaluated = len(moved)
+		accelerations = self.__accelerations
+
+		# All bodies are synchronized at the start of the step
+		levels = self.__desired_levels(accelerations, velocities, radii, dt)
+		velocities += accelerations * (dt / 2.0 ** levels / 2)[:, None]
+
+		for substep in range(1, substeps + 1):
+			positions += velocities * h
+
+			# The bodies whose step ends now, i.e. every body when the whole step ends
+			active = np.flatnonzero(substep % (substeps >> levels) == 0)
+			if len(active) == 0:
+				continue
+
+			accelerations[active] = self._accelerations(bodies, accelerate, active)
+			evaluated += len(active)
+			velocities[active] += accelerations[active] * (dt / 2.0 ** levels[active] / 2)[:, None]
+
+			if substep < substeps:
+				# A body can only move to a larger step if the step would start at a multiple of that step
+				synchronized = (substep & -substep).bit_length() - 1  # Amount of trailing zero bits
+				newLevels = np.maximum(self.__desired_levels(accelerations[active], velocities[active], radii[active], dt), self.maxLevel - synchronized)
+				levels[active] = newLevels
+				velocities[active] += accelerations[active] * (dt / 2.0 ** newLevels / 2)[:, None]
+
+		self.levels = levels
+		self.evaluations = evaluated / max(len(bodies), 1)
+		self.__positions = positions.copy()
+		bodies.accelerations = 0
+		bodies.cool(dt)
+
+
+INTEGRATORS = {'euler': Euler, 'leapfrog': Leapfrog, 'yoshida4': Yoshida4, 'rk4': RK4, 'block': BlockLeapfrog}
@@ -0,0 +1,295 @@
+from Engine.Core.app import App
+from Engine.Utils.utils import Rect, Colors
+
+from body import BodySystem
+
+import numpy as np
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+	"""
+	Spread the lower 32 bits of each value so there is a zero bit between every bit (used for interleaving).
+
+	:param values: array of unsigned integers
+	:return: array of spread unsigned 64-bit integers
+	"""
+
+	values = values.astype(np.uint64) & np.uint64(0x00000000FFFFFFFF)
+	values = (values | (values << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+	values = (values | (values << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+	values = (values | (values << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+	values = (values | (values << np.uint64(2))) & np.uint64(0x3333333333333333)
+	values = (values | (values << np.uint64(1))) & np.uint64(0x5555555555555555)
+	return values
+
+
+def morton_keys(column: np.ndarray, row: np.ndarray) -> np.ndarray:
+	"""
+	Interleave cell coordinates into Morton (Z-order) keys.
+	Every pair of bits is (row bit, column bit), so the quadrants are ordered nw, ne, sw, se like QuadTree.children.
+
+	:param column: array of cell columns (growing to the right)
+	:param row: array of cell rows (growing downwards)
+	:return: array of unsigned 64-bit Morton keys
+	"""
+
+	return (_spread_bits(row) << np.uint64(1)) | _spread_bits(column)
+
+
+class LinearQuadTree:
+	"""
+	A quadtree stored in flat arrays, built from the sorted Morton keys of the bodies.
+	Nodes are stored level by level, and the bodies of every node are a contiguous range of the sorted bodies.
+
+	Attributes:
+		boundary: The boundary of the root node.
+		leafCapacity: The amount of bodies a leaf can hold before it is subdivided.
+		maxDepth: The maximum depth of the tree, bodies closer than a cell at this depth share a leaf.
+		order: Indices of the contained bodies sorted by their Morton key.
+		keys: The sorted Morton keys of the contained bodies.
+		level: The level of every node.
+		start: Index of the first body of every node in order.
+		count: The amount of bodies in every node.
+		firstChild: Index of the first child of every node (-1 for leaves), children are stored contiguously.
+		childCount: The amount of children of every node.
+		totalMass: The total mass of every node.
+		centerOfMass: The center of mass of every node.
+		x, y, width, height: The boundary of every node (top left corner, like Rect).
+
+	Methods:
+		accelerations: Calculates the accelerations of given bodies using Barnes-Hut.
+		gravity: Applies Barnes-Hut gravity to a system of bodies.
+		draw: Draws the nodes of the tree.
+	"""
+
+	# The arrays needed to traverse a built tree
+	ARRAYS = ('order', 'level', 'start', 'count', 'firstChild', 'childCount', 'totalMass', 'centerOfMass', 'width', 'bodyPositions', 'bodyMasses', 'bodyRadii')
+
+	def __init__(self, boundary: Rect, positions: np.ndarray, masses: np.ndarray, radii: np.ndarray, leafCapacity: int = 1, maxDepth: int = 24):
+		self.boundary = Rect(boundary)
+		self.leafCapacity = leafCapacity
+		self.maxDepth = maxDepth
+		self.nodesVisited = 0
+
+		self.__build(np.asarray(positions, dtype=float), np.asarray(masses, dtype=float), np.asarray(radii, dtype=float))
+
+	@classmethod
+	def _view(cls, boundary: Rect, arrays: dict) -> 'LinearQuadTree':
+		"""
+		Create a tree from the arrays of an already built tree (see ARRAYS) without building it, e.g. from shared memory.
+		Only traversal is supported, the node boundaries used for drawing are not restored.
+
+		:param boundary: the boundary of the root node
+		:param arrays: dictionary with every array in ARRAYS
+		:return: The tree viewing the arrays
+		"""
+
+		tree = cls.__new__(cls)
+		tree.boundary = Rect(boundary)
+		tree.nodesVisited = 0
+		for name in cls.ARRAYS:
+			setattr(tree, name, arrays[name])
+		return tree
+
+	def __build(self, positions: np.ndarray, masses: np.ndarray, radii: np.ndarray):
+		"""
+		Build the tree: one sort of the Morton keys and a vectorized pass per level.
+
+		:param positions: (N, 2) array of body positions
+		:param masses: (N,) array of body masses
+		:param radii: (N,) array of body radii
+		:return: None
+		"""
+
+		x, y, w, h = self.boundary
+		cells = 1 << self.maxDepth
+
+		# Normalized coordinates with rows growing downwards, as the top of a Rect is its y coordinate
+		u = (positions[:, 0] - x) / w
+		v = (y - positions[:, 1]) / h
+		inside = np.flatnonzero((u >= 0) & (u <= 1) & (v >= 0) & (v <= 1))  # Like QuadTree.insert, ignore bodies outside the boundary
+
+		column = np.minimum((u[inside] * cells).astype(np.int64), cells - 1)
+		row = np.minimum((v[inside] * cells).astype(np.int64), cells - 1)
+		keys = morton_keys(column, row)
+
+		sort = np.argsort(keys, kind='stable')
+		self.order = inside[sort]
+		self.keys = keys[sort]
+		column, row = column[sort], row[sort]
+
+		# The contained bodies in sorted order, used for leaf interactions
+		self.bodyPositions = positions[self.order]
+		self.bodyMasses = masses[self.order]
+		self.bodyRadii = radii[self.order]
+
+		level, start, count, firstChild = [], [], [], []
+		nodeCount = 0
+
+		levelStart = np.zeros(1 if len(self.order) else 0, dtype=np.int64)
+		levelCount = np.full(len(levelStart), len(self.order), dtype=np.int64)
+
+		for depth in range(self.maxDepth + 1):
+			level.append(np.full(len(levelStart), depth, dtype=np.int64))
+			start.append(levelStart)
+			count.append(levelCount)
+			nodeCount += len(levelStart)
+
+			internal = levelCount > self.leafCapacity if depth < self.maxDepth else np.zeros(len(levelStart), dtype=bool)
+			children = np.full(len(levelStart), -1, dtype=np.int64)
+			if not internal.any():
+				firstChild.append(children)
+				break
+
+			# Bodies of internal nodes are split into segments of equal key prefix at the next level
+			covered = np.repeat(levelStart, levelCount) + self.__ranks(levelCount)
+			split = np.zeros(len(self.keys), dtype=bool)
+			split[covered] = np.repeat(internal, levelCount)
+			parentEnd = np.zeros(len(self.keys), dtype=np.int64)
+			parentEnd[covered] = np.repeat(levelStart + levelCount, levelCount)
+
+			prefix = self.keys >> np.uint64(2 * (self.maxDepth - depth - 1))
+			boundaries = np.ones(len(self.keys), dtype=bool)
+			boundaries[1:] = prefix[1:] != prefix[:-1]
+
+			nextStart = np.flatnonzero(boundaries & split)
+			nextEnd = np.minimum(np.append(nextStart[1:], len(self.keys)), parentEnd[nextStart])  # Don't run into the next node
+
+			children[internal] = nodeCount + np.searchsorted(nextStart, levelStart[internal])
+			firstChild.append(children)
+
+			levelStart, levelCount = nextStart, nextEnd - nextStart
+
+		self.level = np.concatenate(level) if level else np.zeros(0, dtype=np.int64)
+		self.start = np.concatenate(start) if start else np.zeros(0, dtype=np.int64)
+		self.count = np.concatenate(count) if count else np.zeros(0, dtype=np.int64)
+		self.firstChild = np.concatenate(firstChild) if firstChild else np.zeros(0, dtype=np.int64)
+
+		# Children are contiguous, so the amount of children is the distance to the first child of the next internal node
+		self.childCount = np.zeros(len(self.level), dtype=np.int64)
+		internal = np.flatnonzero(self.firstChild >= 0)
+		self.childCount[internal] = np.diff(np.append(self.firstChild[internal], len(self.level)))
+
+		# Mass moments of all nodes at once from prefix sums over the sorted bodies
+		end = self.start + self.count
+		cumulativeMass = np.concatenate(([0], np.cumsum(self.bodyMasses)))
+		cumulativeMoment = np.concatenate((np.zeros((1, 2)), np.cumsum(self.bodyPositions * self.bodyMasses[:, None], axis=0)))
+		self.totalMass = cumulativeMass[end] - cumulativeMass[self.start]
+		moment = cumulativeMoment[end] - cumulativeMoment[self.start]
+		self.centerOfMass = np.divide(moment, self.totalMass[:, None], out=np.zeros_like(moment), where=self.totalMass[:, None] > 0)
+
+		# Node boundaries from the cell of the first body of every node
+		shift = self.maxDepth - self.level
+		scale = 1.0 / (1 << self.level)
+		self.width = w * scale
+		self.height = h * scale
+		self.x = x + (column[self.start] >> shift) * self.width if len(self.level) else np.zeros(0)
+		self.y = y - (row[self.start] >> shift) * self.height if len(self.level) else np.zeros(0)
+
+	def __len__(self):
+		return len(self.level)
+
+	def accelerations(self, positions: np.ndarray, radii: np.ndarray, theta: float, g: float, targets: np.ndarray = None,
+	                  chunkSize: int = 4096) -> np.ndarray:
+		"""
+		Calculate the gravitational acceleration of given bodies using Barnes-Hut with the same criterion as QuadTree.gravity.
+		All (body, node) pairs of a chunk of bodies are processed one tree level at a time as whole arrays.
+
+		:param positions: (N, 2) array of body positions
+		:param radii: (N,) array of body radii
+		:param theta: opening criterion, a node is approximated if (width / distance)^2 < theta
+		:param g: gravitational constant
+		:param targets: indices of the bodies to calculate the acceleration for (default: all bodies)
+		:param chunkSize: the amount of bodies traversing the tree at once (default: 4096)
+		:return: (len(targets), 2) array of accelerations
+		"""
+
+		targets = np.arange(len(positions)) if targets is None else np.asarray(targets)
+		accelerations = np.zeros((len(targets), 2))
+		if len(self.level) == 0:
+			return accelerations
+
+		for c in range(0, len(targets), chunkSize):
+			chunk = targets[c:c + chunkSize]
+			accelerations[c:c + chunkSize] = self.__walk(positions[chunk], radii[chunk], chunk, theta, g)
+
+		return accelerations
+
+	def __walk(self, positions: np.ndarray, radii: np.ndarray, indices: np.ndarray, theta: float, g: float) -> np.ndarray:
+		bodies = len(indices)
+		ax, ay = np.zeros(bodies), np.zeros(bodies)
+
+		body = np.arange(bodies)
+		node = np.zeros(bodies, dtype=np.int64)
+
+		while len(body):
+			self.nodesVisited += len(body)
+
+			leaf = self.firstChild[node] < 0
+
+			# Internal nodes: approximate by the center of mass if far enough, otherwise open the node
+			inner, innerNode = body[~leaf], node[~leaf]
+			dx = self.centerOfMass[innerNode, 0] - positions[inner, 0]
+			dy = self.centerOfMass[innerNode, 1] - positions[inner, 1]
+			distSquared = dx * dx + dy * dy
+			far = self.width[innerNode] ** 2 < theta * distSquared
+
+			scale = g * self.totalMass[innerNode[far]] / (distSquared[far] * np.sqrt(distSquared[far]))
+			ax += np.bincount(inner[far], scale * dx[far], bodies)
+			ay += np.bincount(inner[far], scale * dy[far], bodies)
+
+			# Leaves: direct interaction with every contained body
+			self.__leaf_interactions(positions, radii, indices, body[leaf], node[leaf], g, ax, ay)
+
+			# Open the remaining nodes by replacing them with their children
+			near, nearNode = inner[~far], innerNode[~far]
+			children = self.childCount[nearNode]
+			body = np.repeat(near, children)
+			node = np.repeat(self.firstChild[nearNode], children) + self.__ranks(children)
+
+		return np.stack((ax, ay), axis=1)
+
+	def __leaf_interactions(self, positions, radii, indices, body, node, g, ax, ay):
+		counts = self.count[node]
+		body = np.repeat(body, counts)
+		other = np.repeat(self.start[node], counts) + self.__ranks(counts)
+
+		dx = self.bodyPositions[other, 0] - positions[body, 0]
+		dy = self.bodyPositions[other, 1] - positions[body, 1]
+		distSquared = dx * dx + dy * dy
+		minDist = self.bodyRadii[other] + radii[body]
+
+		# A body does not pull on itself (or on bodies at the exact same position)
+		valid = (self.order[other] != indices[body]) & (distSquared > 0)
+		scale = np.zeros(len(body))
+		scale[valid] = g * self.bodyMasses[other[valid]] / (np.maximum(distSquared[valid], minDist[valid] ** 2) * np.sqrt(distSquared[valid]))
+
+		ax += np.bincount(body, scale * dx, len(ax))
+		ay += np.bincount(body, scale * dy, len(ay))
+
+	@staticmethod
+	def __ranks(counts: np.ndarray) -> np.ndarray:
+		"""
+		Create the ranks 0..count-1 for every count, concatenated.
+
+		:param counts: array of counts
+		:return: array of ranks
+		"""
+
+		return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+	def gravity(self, bodies: BodySystem, theta: float, g: float):
+		"""
+		Apply Barnes-Hut gravity to all bodies in the system.
+
+		:param bodies: system of bodies to apply gravity to
+		:param theta: opening criterion, a node is approximated if (width / distance)^2 < theta
+		:param g: gravitational constant
+		:return: None
+		"""
+
+		bodies.accelerations += self.accelerations(bodies.positions, bodies.radii, theta, g)
+
+	def draw(self, app: App):
+		for x, y, width, height in zip(self.x, self.y, self.width, self.height):
+			app.draw_rect((x, y), width, height, Colors.MAGENTA, 1, fromCamera=True)
@@ -1,44 +1,68 @@
+from Engine.Core.core import *
+from Engine.Utils.utils import *
 from Engine.engine import *
 
-from body import Body
-from quadtree import QuadTree
+from simulation import Simulation
+from integrators import INTEGRATORS
+from trajectory import TrajectoryWriter, Trajectory
 
 import pygame  # Only for keycodes!
-from numpy import random
+from argparse import ArgumentParser
+import numpy as np
 
 
 class Game(PygameApp):
-	def __init__(self, windowSize: tuple):
-		super().__init__(windowSize, 60, camera=Camera2D(Vector2(0, 0), Vector2(windowSize), 1))
-
-		scale = 10
-		boundScale = 100
-		self.bounds = Rect(-self.windowSize.x / 2 * boundScale, self.windowSize.y / 2 * boundScale, self.windowSize.x * boundScale, self.windowSize.y * boundScale)
-
-		# Generate random bodies
-		bodies = 300
-		maxSpeed = 40
-		minMass, maxMass = 10, 1000
-
-		self.bodies = []  # Large center body
-
-		for _ in range(bodies):
-			pos = Vector2(random.randint(self.bounds.x / scale, (self.bounds.x + self.bounds.width) / scale),
-			              random.randint((self.bounds.y - self.bounds.height) / scale, self.bounds.y) / scale)
-
-			mass = random.randint(minMass, maxMass)
-
-			self.bodies.append(Body(pos, mass))
-
-		# Give bodies initial velocity to spin around center
-		for body in self.bodies:
-			toCenter = -body.position.normalize()
-			body.velocity = Vector2(toCenter.y, -toCenter.x) * maxSpeed
-
-		self.bodies.append(Body(Vector2(0, 0), 1000000, Vector2(0, 0)))  # Large center body
+	"""
+	A viewer of a simulation: steps it updateRate times per second and draws it at the framerate,
+	with the bodies interpolated between the last two steps.
+	"""
+
+	def __init__(self, windowSize: tuple, simulation: Simulation, fps: int = 60, updateRate: int = 60, timeStep: float = 1,
+	             recorder: TrajectoryWriter = None, checkpoint: str = None, checkpointEvery: int = 1000):
+		super().__init__(windowSize, fps, camera=Camera2D(Vector2(0, 0), Vector2(windowSize), 1), updateRate=updateRate, maxFrameSkip=2)
+
+		self.simulation = simulation
+		self.timeStep = timeStep
+		self.recorder = recorder
+		self.checkpoint = checkpoint
+		self.checkpointEvery = checkpointEvery
+		self.levelOfDetail = False  # Toggled with L, draws far away groups of bodies as one
+		self.lodPixelSize = 2  # The size on screen below which groups of bodies are drawn as one
+		self.previousPositions = self.simulation.bodies.positions.copy()
+		self.simulation.profiler = self.profiler  # Toggled with P, shows where the time of a frame goes
+
+	def govern(self, budget: float, maxTheta: float = 2, maxCollisionInterval: int = 4):
+		"""
+		Hold the frame time within a budget by lowering the quality of the simulation while frames take too long:
+		first the level of detail of the drawing, then how often slow or distant bodies are checked for collisions,
+		then the accuracy of gravity. Quality is restored when there is headroom again.
+
+		:param budget: the frame time to stay below in seconds
+		:param maxTheta: the largest opening criterion of the quadtree allowed, see accuracy.py for its error (default: 2)
+		:param maxCollisionInterval: the most steps a slow or distant body may go without a collision check (default: 4)
+		:return: None
+		"""
+
+		simulation = self.simulation
+
+		def set_detail(pixelSize):
+			self.levelOfDetail = pixelSize is not None
+			self.lodPixelSize = pixelSize or 2
+
+		def set_theta(theta):
+			simulation.theta = theta
+
+		def set_collision_interval(interval):
+			simulation.collisionInterval = interval
+
+		thetas = sorted(set(np.geomspace(simulation.theta, max(maxTheta, simulation.theta), 5).round(3).tolist()))
+		intervals = [1 << k for k in range(int(np.log2(max(maxCollisionInterval, 1))) + 1)]
+		self.governor = Governor(budget, [Knob("detail", [None, 2, 4, 8], set_detail),
+		                                  Knob("collisions", intervals, set_collision_interval),
+		                                  Knob("theta", thetas, set_theta)])
 
 	def draw_debug(self):
-		self.quadTree.draw(self)
+		self.simulation.quadTree.draw(self)
 
 	def camera_control(self):
 		if self.isKeyPressed[pygame.K_w]:
@@ -56,11 +80,20 @@ class Game(PygameApp):
 			self.mainCamera.zoom_out()
 
 	def on_draw(self):
-		for body in self.bodies:
-			body.draw(self)
+		bodies = self.simulation.bodies
+		with self.profiler.phase("draw bodies"):
+			if self.levelOfDetail:
+				self.simulation.quadTree.draw_bodies(self, bodies, self.lodPixelSize)
+			else:
+				positions = bodies.positions
+				if len(self.previousPositions) == len(positions):
+					positions = self.previousPositions + (positions - self.previousPositions) * self.alpha
+
+				bodies.draw(self, positions)
 
 		if self.debug:
-			self.draw_debug()
+			with self.profiler.phase("draw tree"):
+				self.draw_debug()
 
 	def on_update(self):
 		if self.isKeyPressed[pygame.K_ESCAPE]:
@@ -71,43 +104,146 @@ class Game(PygameApp):
 		else:
 			self.debug = False
 
+		for event in self.events:
+			if event.type == pygame.KEYDOWN and event.key == pygame.K_l:
+				self.levelOfDetail = not self.levelOfDetail
+			if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+				self.profiler.enabled = not self.profiler.enabled
+
 		self.camera_control()
 
-		self.quadTree = QuadTree(self.bounds)
+		# Fast bodies in view are checked for collisions every step, even when collisions are thinned
+		camera, halfSize = self.mainCamera, self.windowSize / 2 / self.mainCamera.zoom
+		self.simulation.focus = (camera.position.x - halfSize.x, camera.position.y + halfSize.y,
+		                         camera.position.x + halfSize.x, camera.position.y - halfSize.y)
+
+	def on_fixed_update(self, dt):
+		self.previousPositions = self.simulation.bodies.positions.copy()
+		self.simulation.step(self.timeStep)  # The simulated time per update is independent of the framerate
+
+		if self.recorder is not None:
+			self.recorder.write(self.simulation.bodies, self.simulation.time)
+		if self.checkpoint is not None and self.simulation.steps % self.checkpointEvery == 0:
+			self.simulation.save(self.checkpoint)
+
+	def on_quit(self):
+		if self.recorder is not None:
+			self.recorder.close()
+		if self.checkpoint is not None:
+			self.simulation.save(self.checkpoint)
 
-		for body in self.bodies:
-			self.quadTree.insert(body)
 
-		# GRAVITY
-		for body in self.bodies:
-			"""
-			# NAIVE GRAVITY
-			for body2 in self.bodies:
-				if body != body2:
-					body.apply_force(body.gravitational_force(body2))
-			"""
+class Replay(PygameApp):
+	"""
+	A viewer of a recorded trajectory: shows one frame per update without simulating anything, looping at the end.
+	"""
 
-			# QUADTREE GRAVITY
-			self.quadTree.gravity(body, 1, 5)
+	def __init__(self, windowSize: tuple, trajectory: Trajectory, fps: int = 60, updateRate: int = 60):
+		super().__init__(windowSize, fps, camera=Camera2D(Vector2(0, 0), Vector2(windowSize), 1), updateRate=updateRate)
 
-		# COLLISION DETECTION
-		for i, body in enumerate(self.bodies):
-			"""
-			# NAIVE COLLISION DETECTION
-			for body2 in self.bodies[i:]:
-				if body != body2:
-					body.collide(body2)
-			"""
+		self.trajectory = trajectory
+		self.frame = 0
+		self.bodies = trajectory.bodies(0)  # Holds the radii and colors, the positions are read from the file
+
+	def camera_control(self):
+		if self.isKeyPressed[pygame.K_w]:
+			self.mainCamera.move(Vector2(0, 1))
+		if self.isKeyPressed[pygame.K_s]:
+			self.mainCamera.move(Vector2(0, -1))
+		if self.isKeyPressed[pygame.K_a]:
+			self.mainCamera.move(Vector2(-1, 0))
+		if self.isKeyPressed[pygame.K_d]:
+			self.mainCamera.move(Vector2(1, 0))
 
-			# QUADTREE COLLISION DETECTION
-			self.quadTree.collide(body)
+		if self.isKeyPressed[pygame.K_q]:
+			self.mainCamera.zoom_in()
+		if self.isKeyPressed[pygame.K_e]:
+			self.mainCamera.zoom_out()
 
-			body.collide(self.bounds)
+	def on_draw(self):
+		frame, following = self.frame, min(self.frame + 1, len(self.trajectory) - 1)
+		previous, current = self.trajectory.positions[frame], self.trajectory.positions[following]
+		self.bodies.draw(self, previous + (current - previous) * self.alpha)
 
-		# UPDATE BODIES
-		for body in self.bodies:
-			body.update(1)
+	def on_update(self):
+		if self.isKeyPressed[pygame.K_ESCAPE]:
+			self.quit()
 
+		self.camera_control()
 
-game = Game((800, 800))
-game.run()
+	def on_fixed_update(self, dt):
+		self.frame = (self.frame + 1) % max(len(self.trajectory) - 1, 1)
+
+
+if __name__ == '__main__':  # Worker processes may import this module
+	parser = ArgumentParser(description="N-body simulation")
+	parser.add_argument('--headless', action='store_true', help="run without a window, as fast as possible")
+	parser.add_argument('--steps', type=int, default=1000, help="the amount of steps to run headless (default: 1000)")
+	parser.add_argument('--bodies', type=int, default=300, help="the amount of bodies (default: 300)")
+	parser.add_argument('--seed', type=int, default=None, help="seed of the initial conditions (default: random)")
+	parser.add_argument('--theta', type=float, default=1, help="the opening criterion of the quadtree, see accuracy.py (default: 1)")
+	parser.add_argument('--leaf', type=int, default=8, help="the leaf capacity of the quadtree, see accuracy.py (default: 8)")
+	parser.add_argument('--integrator', choices=INTEGRATORS, default='euler', help="the integrator advancing the bodies (default: euler)")
+	parser.add_argument('--dt', type=float, default=1, help="the time step (default: 1)")
+	parser.add_argument('--fps', type=int, default=60, help="the framerate of the window, 0 for uncapped (default: 60)")
+	parser.add_argument('--record', metavar='PATH', help="stream the steps to a trajectory file")
+	parser.add_argument('--every', type=int, default=1, help="only record every k-th step (default: 1)")
+	parser.add_argument('--double', action='store_true', help="record in float64 instead of float32")
+	parser.add_argument('--checkpoint', metavar='PATH', help="periodically save the full state to a checkpoint file")
+	parser.add_argument('--checkpoint-every', type=int, default=1000, help="the amount of steps between checkpoints (default: 1000)")
+	parser.add_argument('--resume', metavar='PATH', help="continue from a checkpoint file (and keep saving to it)")
+	parser.add_argument('--replay', metavar='PATH', help="play a trajectory file instead of simulating")
+	parser.add_argument('--rate', type=int, default=60, help="the amount of steps per second in the window (default: 60)")
+	parser.add_argument('--govern', action='store_true', help="lower the quality of the simulation to hold the framerate")
+	parser.add_argument('--max-theta', type=float, default=2, help="the largest theta the governor may use (default: 2)")
+	parser.add_argument('--max-collision-interval', type=int, default=4,
+	                    help="the most steps the governor lets slow or distant bodies go without collision checks (default: 4)")
+	parser.add_argument('--profile', metavar='PATH', help="profile every frame (every step when headless) to a CSV file")
+	args = parser.parse_args()
+
+	windowSize = (800, 800)
+
+	if args.replay:
+		replay = Replay(windowSize, Trajectory(args.replay), args.fps, args.rate)
+		replay.run()
+	else:
+		if args.resume:
+			simulation = Simulation.load(args.resume)
+		else:
+			simulation = Simulation.disc(windowSize, args.bodies, seed=args.seed, theta=args.theta, leafCapacity=args.leaf,
+			                             integrator=INTEGRATORS[args.integrator]())
+
+		checkpoint = args.checkpoint or args.resume
+		recorder = None
+		if args.record:
+			recorder = TrajectoryWriter(args.record, len(simulation.bodies), args.every, float if args.double else np.float32)
+
+		if args.headless:
+			if args.profile:
+				simulation.profiler.enabled = True
+				simulation.profiler.open_csv(args.profile)
+
+			def callback(sim):
+				sim.profiler.end_frame()
+				if recorder is not None:
+					recorder.write(sim.bodies, sim.time)
+				if checkpoint is not None and sim.steps % args.checkpoint_every == 0:
+					sim.save(checkpoint)
+
+			try:
+				elapsed = simulation.run(args.steps, args.dt, callback)
+				print(f"{args.steps} steps of {len(simulation.bodies)} bodies in {elapsed:.2f} s ({args.steps / elapsed:.1f} steps/s)")
+			finally:  # Also keep the state when interrupted
+				simulation.profiler.close()
+				if recorder is not None:
+					recorder.close()
+				if checkpoint is not None:
+					simulation.save(checkpoint)
+		else:
+			game = Game(windowSize, simulation, args.fps, args.rate, args.dt, recorder, checkpoint, args.checkpoint_every)
+			if args.profile:
+				game.profiler.enabled = True
+				game.profiler.open_csv(args.profile)
+			if args.govern:
+				game.govern(1 / (args.fps or 60), args.max_theta, args.max_collision_interval)
+			game.run()
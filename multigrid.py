@@ -0,0 +1,171 @@
+from Engine.Core.app import App
+from Engine.Utils.utils import Colors
+
+import numpy as np
+
+
+class MultiLevelGrid:
+	"""
+	A hierarchy of uniform grids for finding colliding bodies of very different sizes (broad phase).
+	Every level has cells twice as large as the level below it, and every body is stored once, in the cell of its center on the
+	lowest level whose cells are at least as wide as the body. Two touching bodies are then always in neighbouring cells of the
+	level of the larger one, so a body only looks at the 3x3 cells around it on its own level and the levels above it.
+	A few giant bodies sit alone on a high level instead of widening the query of every other body (like QuadTree.collision_pairs)
+	or covering many cells (like SpatialHash), so queries cost the same however mixed the radii are.
+
+	Attributes:
+		cellSize: The width and height of a cell on the lowest level.
+		levels: The level of every body.
+		candidates: The amount of candidate pairs the last query found.
+
+	Methods:
+		build: Stores the bodies in the grids.
+		candidate_pairs: Finds all pairs of bodies in neighbouring cells of the level of the larger one.
+		colliding_pairs: Finds all pairs of bodies that are touching.
+		draw: Draws the non-empty cells of every level.
+	"""
+
+	OFFSETS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+	def __init__(self, cellSize: float = None):
+		"""
+		Initialize an empty grid.
+
+		:param cellSize: the width and height of a cell on the lowest level, smaller bodies share it (default: the mean diameter of the bodies, computed on every build)
+		"""
+
+		self.fixedCellSize = cellSize
+		self.cellSize = cellSize
+		self.positions = np.zeros((0, 2))
+		self.radii = np.zeros(0)
+		self.levels = np.zeros(0, dtype=np.int64)
+		self.candidates = 0
+		self.__grids = []  # (level, order, cells, start, count) of every non-empty level, lowest first
+
+	def build(self, positions: np.ndarray, radii: np.ndarray):
+		"""
+		Store every body in the cell of its center on its level.
+
+		:param positions: (N, 2) array of body positions
+		:param radii: (N,) array of body radii
+		:return: None
+		"""
+
+		self.positions = np.asarray(positions, dtype=float)
+		self.radii = np.asarray(radii, dtype=float)
+		self.__grids = []
+		if len(self.radii) == 0:
+			self.levels = np.zeros(0, dtype=np.int64)
+			return
+
+		self.cellSize = self.fixedCellSize or max(2 * float(self.radii.mean()), 1e-9)
+
+		# The lowest level whose cells are at least as wide as the body
+		with np.errstate(divide='ignore'):
+			self.levels = np.maximum(np.ceil(np.log2(2 * self.radii / self.cellSize)), 0).astype(np.int64)
+
+		for level in np.unique(self.levels).tolist():
+			members = np.flatnonzero(self.levels == level)
+			keys = self.__keys(self.__cells(members, level))
+			sort = np.argsort(keys, kind='stable')
+			order, keys = members[sort], keys[sort]
+
+			first = np.ones(len(keys), dtype=bool)
+			first[1:] = keys[1:] != keys[:-1]
+			start = np.flatnonzero(first)
+			self.__grids.append((level, order, keys[start], start, np.diff(np.append(start, len(keys)))))
+
+	def __cells(self, bodies: np.ndarray, level: int) -> np.ndarray:
+		"""
+		Get the cell of the center of bodies on a level.
+
+		:param bodies: index array of the bodies
+		:param level: the level
+		:return: (k, 2) array of the column and row of every cell
+		"""
+
+		return np.floor(self.positions[bodies] / (self.cellSize * (1 << level))).astype(np.int64)
+
+	@staticmethod
+	def __keys(cells: np.ndarray) -> np.ndarray:
+		"""
+		Get one integer key for every cell (columns and rows must fit in 31 bits).
+
+		:param cells: (k, 2) array of the column and row of every cell
+		:return: (k,) array of keys
+		"""
+
+		return (cells[:, 0] << 32) + cells[:, 1]
+
+	def candidate_pairs(self) -> tuple:
+		"""
+		Find all pairs of bodies in neighbouring cells on the level of the larger one, every pair is returned once.
+
+		:return: Tuple of two index arrays (i, j) with i < j
+		"""
+
+		first, second = [], []
+		for level, order, cells, start, count in self.__grids:
+			# Every body on this level or below looks for the bodies of this level around it
+			queries = np.flatnonzero(self.levels <= level)
+			queryCells = self.__cells(queries, level)
+
+			for dx, dy in self.OFFSETS:
+				keys = self.__keys(queryCells + (dx, dy))
+				found = np.minimum(np.searchsorted(cells, keys), len(cells) - 1)
+				hit = np.flatnonzero(cells[found] == keys)
+				cell = found[hit]
+
+				query = np.repeat(queries[hit], count[cell])
+				other = order[np.repeat(start[cell], count[cell]) + self.__ranks(count[cell])]
+
+				# Bodies of the same level find each other from both sides
+				keep = (self.levels[query] < level) | (query < other)
+				first.append(query[keep])
+				second.append(other[keep])
+
+		if not first:
+			return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+		i, j = np.concatenate(first), np.concatenate(second)
+		return np.minimum(i, j), np.maximum(i, j)
+
+	def colliding_pairs(self, indices: np.ndarray = None) -> tuple:
+		"""
+		Find all pairs of touching bodies (narrow phase on the candidate pairs), every pair is returned once.
+
+		:param indices: index array of the only bodies to find the touching bodies of, e.g. to check slow bodies less often (default: all bodies)
+		:return: Tuple of two index arrays (i, j) with i < j
+		"""
+
+		i, j = self.candidate_pairs()
+		if indices is not None:
+			# The broad phase is cheap, only the pairs of the checked bodies are tested and resolved
+			checked = np.zeros(len(self.radii), dtype=bool)
+			checked[indices] = True
+			pairs = checked[i] | checked[j]
+			i, j = i[pairs], j[pairs]
+		self.candidates = len(i)
+
+		displacement = self.positions[i] - self.positions[j]
+		totSize = self.radii[i] + self.radii[j]
+		touching = np.einsum('ij,ij->i', displacement, displacement) <= totSize * totSize  # Same test as Body.is_colliding
+		return i[touching], j[touching]
+
+	@staticmethod
+	def __ranks(counts: np.ndarray) -> np.ndarray:
+		"""
+		Create the ranks 0..count-1 for every count, concatenated.
+
+		:param counts: array of counts
+		:return: array of ranks
+		"""
+
+		return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+	def draw(self, app: App):
+		for level, order, cells, start, count in self.__grids:
+			size = self.cellSize * (1 << level)
+			columns = (cells + (1 << 31)) >> 32  # Rows are signed
+			for column, row in zip(columns.tolist(), (cells - (columns << 32)).tolist()):
+				app.draw_rect((column * size, (row + 1) * size), size, size, Colors.MAGENTA, 1, fromCamera=True)
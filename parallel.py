@@ -0,0 +1,180 @@
+from Engine.Utils.utils import Rect
+
+from body import BodySystem
+from linearquadtree import LinearQuadTree
+
+from multiprocessing import Process, Queue, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import os
+import traceback
+
+import numpy as np
+
+
+def _worker(tasks: Queue, done: Queue):
+	"""
+	Worker process of ParallelGravity: computes the accelerations of a slice of the bodies for every task until it gets None.
+
+	:param tasks: queue of (layout, boundary, first, last, theta, g) tasks, where layout maps array names to (block name, shape, dtype)
+	:param done: queue to report every finished task on (None, or the traceback of an error)
+	:return: None
+	"""
+
+	attached = {}
+	while True:
+		task = tasks.get()
+		if task is None:
+			break
+
+		try:
+			layout, boundary, first, last, theta, g = task
+
+			# Blocks are only replaced when they grow, so the attachments are kept between frames
+			for name in set(attached) - {block for block, _, _ in layout.values()}:
+				attached.pop(name).close()
+
+			arrays = {}
+			for array, (name, shape, dtype) in layout.items():
+				if name not in attached:
+					attached[name] = SharedMemory(name)
+				arrays[array] = np.ndarray(shape, dtype, buffer=attached[name].buf)
+
+			tree = LinearQuadTree._view(boundary, arrays)
+			arrays['accelerations'][first:last] = tree.accelerations(arrays['positions'], arrays['radii'], theta, g, targets=np.arange(first, last))
+			done.put(None)
+		except Exception:
+			done.put(traceback.format_exc())
+
+	for block in attached.values():
+		block.close()
+
+
+class ParallelGravity:
+	"""
+	Barnes-Hut gravity evaluated by a pool of worker processes.
+	The body state and the flattened tree (see LinearQuadTree) are written to shared memory every frame, and every worker calculates
+	the accelerations of its slice of the bodies straight from it. Only the names of the shared blocks are sent to the workers.
+
+	Attributes:
+		boundary: The boundary of the tree.
+		workers: The amount of worker processes.
+		leafCapacity: The amount of bodies a leaf can hold before it is subdivided.
+		maxDepth: The maximum depth of the tree.
+
+	Methods:
+		accelerations: Calculates the accelerations of all bodies.
+		gravity: Applies gravity to a system of bodies.
+		close: Stops the workers and frees the shared memory.
+	"""
+
+	def __init__(self, boundary: Rect, workers: int = None, leafCapacity: int = 8, maxDepth: int = 24):
+		"""
+		Start the worker processes.
+
+		:param boundary: the boundary of the tree, bodies outside it are not attracted by anything
+		:param workers: the amount of worker processes (default: the amount of CPUs)
+		:param leafCapacity: the amount of bodies a leaf can hold before it is subdivided (default: 8)
+		:param maxDepth: the maximum depth of the tree (default: 24)
+		"""
+
+		self.boundary = Rect(boundary)
+		self.workers = workers or os.cpu_count() or 1
+		self.leafCapacity = leafCapacity
+		self.maxDepth = maxDepth
+
+		self.__blocks = {}  # Array name -> shared memory block
+		resource_tracker.ensure_running()  # Share the tracker with the workers, so they don't unlink the blocks they attach to when they exit
+		self.__tasks = Queue()
+		self.__done = Queue()
+		self.__processes = [Process(target=_worker, args=(self.__tasks, self.__done), daemon=True) for _ in range(self.workers)]
+		for process in self.__processes:
+			process.start()
+
+	def __share(self, name: str, array: np.ndarray) -> np.ndarray:
+		"""
+		Get a shared array with the shape and type of given array, holding a copy of it.
+		The block behind it is only replaced when it is too small.
+
+		:param name: the name of the array
+		:param array: the array to share
+		:return: The shared array
+		"""
+
+		block = self.__blocks.get(name)
+		if block is None or block.size < array.nbytes:
+			if block is not None:
+				block.close()
+				block.unlink()
+			block = self.__blocks[name] = SharedMemory(create=True, size=max(2 * array.nbytes, 64))  # Grow geometrically, like BodySystem
+
+		shared = np.ndarray(array.shape, array.dtype, buffer=block.buf)
+		shared[...] = array
+		return shared
+
+	def accelerations(self, positions: np.ndarray, masses: np.ndarray, radii: np.ndarray, theta: float, g: float) -> np.ndarray:
+		"""
+		Calculate the gravitational acceleration of all bodies using Barnes-Hut with the same criterion as QuadTree.gravity.
+
+		:param positions: (N, 2) array of body positions
+		:param masses: (N,) array of body masses
+		:param radii: (N,) array of body radii
+		:param theta: opening criterion, a node is approximated if (width / distance)^2 < theta
+		:param g: gravitational constant
+		:return: (N, 2) array of accelerations
+		"""
+
+		tree = LinearQuadTree(self.boundary, positions, masses, radii, self.leafCapacity, self.maxDepth)
+
+		arrays = {name: self.__share(name, getattr(tree, name)) for name in LinearQuadTree.ARRAYS}
+		arrays['positions'] = self.__share('positions', np.asarray(positions, dtype=float))
+		arrays['radii'] = self.__share('radii', np.asarray(radii, dtype=float))
+		arrays['accelerations'] = self.__share('accelerations', np.zeros((len(masses), 2)))
+		layout = {name: (self.__blocks[name].name, array.shape, array.dtype.str) for name, array in arrays.items()}
+
+		# Every worker gets a contiguous slice of the bodies
+		bounds = np.linspace(0, len(masses), self.workers + 1).astype(int)
+		slices = [(first, last) for first, last in zip(bounds[:-1], bounds[1:]) if last > first]
+		for first, last in slices:
+			self.__tasks.put((layout, tuple(self.boundary), first, last, theta, g))
+
+		errors = [error for error in (self.__done.get() for _ in slices) if error is not None]
+		if errors:
+			raise RuntimeError(f"Gravity worker failed:\n{errors[0]}")
+
+		return arrays['accelerations'].copy()
+
+	def gravity(self, bodies: BodySystem, theta: float, g: float):
+		"""
+		Apply Barnes-Hut gravity to all bodies in the system.
+
+		:param bodies: system of bodies to apply gravity to
+		:param theta: opening criterion, a node is approximated if (width / distance)^2 < theta
+		:param g: gravitational constant
+		:return: None
+		"""
+
+		bodies.accelerations += self.accelerations(bodies.positions, bodies.masses, bodies.radii, theta, g)
+
+	def close(self):
+		"""
+		Stop the worker processes and free the shared memory.
+
+		:return: None
+		"""
+
+		for _ in self.__processes:
+			self.__tasks.put(None)
+		for process in self.__processes:
+			process.join()
+		self.__processes = []
+
+		for block in self.__blocks.values():
+			block.close()
+			block.unlink()
+		self.__blocks = {}
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
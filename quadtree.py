@@ -3,17 +3,41 @@ from Engine.Utils.utils import Vector2, Rect, Colors
 
 from body import Body
 
+import numpy as np
+
+
+COUNTERS = ('gravity nodes', 'interactions', 'collision nodes', 'candidate pairs', 'collision pairs')
+
 
 class QuadTree:
-	def __init__(self, boundary: Rect):
+	def __init__(self, boundary: Rect, leafCapacity: int = 1, maxDepth: int = 32, depth: int = 0):
+		"""
+		Initialize a quadtree node.
+
+		:param boundary: the boundary of the node
+		:param leafCapacity: the amount of bodies a leaf can hold before it is subdivided (default: 1)
+		:param maxDepth: the maximum depth of the tree, leaves at this depth hold any amount of bodies (default: 32)
+		:param depth: the depth of this node (default: 0)
+		"""
+
 		self.boundary = Rect(boundary)
+		self.leafCapacity = leafCapacity
+		self.maxDepth = maxDepth
+		self.depth = depth
 		self.divided = False
 		self.nw, self.ne, self.sw, self.se = None, None, None, None
 		self.children = [None, None, None, None]
 
-		self.body = None
+		self.bodies = []
+		self._leafArrays = None  # Cached positions, masses, radii and indices of the bodies in a leaf
+		self.stray = []  # Bodies inside the boundary that fall between the (integer sized) children
 		self.bodiesCenter = Vector2(0, 0)
 		self.totalMass = 0
+		self.centerOfMass = Vector2(0, 0)  # Cached bodiesCenter / totalMass
+		self.maxRadius = 0  # Radius of the largest body in the node, bodies touching it are at most this far outside the boundary
+		self.bodyCount = 0
+		self.outside = []  # Bodies outside the boundary, only used by the root for refitting
+		self.counters = dict.fromkeys(COUNTERS, 0) if depth == 0 else None  # Work done by the walks from the root, reset by the reader
 
 	def contains_point(self, point: Vector2):
 		return self.boundary.x <= point.x <= self.boundary.x + self.boundary.width and self.boundary.y >= point.y >= self.boundary.y - self.boundary.height
@@ -26,10 +50,11 @@ class QuadTree:
 
 	def subdivide(self):
 		x, y, w, h = self.boundary
-		self.nw = QuadTree(Rect(x, y, w / 2, h / 2))
-		self.ne = QuadTree(Rect(x + w / 2, y, w / 2, h / 2))
-		self.sw = QuadTree(Rect(x, y - h / 2, w / 2, h / 2))
-		self.se = QuadTree(Rect(x + w / 2, y - h / 2, w / 2, h / 2))
+		args = self.leafCapacity, self.maxDepth, self.depth + 1
+		self.nw = QuadTree(Rect(x, y, w / 2, h / 2), *args)
+		self.ne = QuadTree(Rect(x + w / 2, y, w / 2, h / 2), *args)
+		self.sw = QuadTree(Rect(x, y - h / 2, w / 2, h / 2), *args)
+		self.se = QuadTree(Rect(x + w / 2, y - h / 2, w / 2, h / 2), *args)
 		self.children = [self.nw, self.ne, self.sw, self.se]
 		self.divided = True
 
@@ -39,55 +64,249 @@ class QuadTree:
 			return False
 
 		if not self.divided:  # leaf node
-			if self.body is None:  # Empty leaf node
-				self.body = body
-			else:  # The leaf node is already occupied
+			if any(other is body for other in self.bodies):  # Already in this leaf
+				return True
+
+			self._leafArrays = None
+			if len(self.bodies) < self.leafCapacity or self.depth >= self.maxDepth:  # The leaf node has room left
+				self.bodies.append(body)
+			else:  # The leaf node is full
 				self.subdivide()
 
-				# Update which quadrant the contained body is in as it now has been subdivided
-				for child in self.children:
-					child.insert(self.body)
-				for child in self.children:
-					child.insert(body)
+				# Update which quadrant the contained bodies are in as it now has been subdivided
+				for other in self.bodies:
+					self.__insert_children(other)
+				self.__insert_children(body)
 
-				self.body = None
+				self.bodies = []
 		else:
 			# Find which quadrant the body is in and insert it there
-			for child in self.children:
-				child.insert(body)
+			self.__insert_children(body)
 
 		self.bodiesCenter += body.position * body.mass
 		self.totalMass += body.mass
+		if self.totalMass:
+			self.centerOfMass = self.bodiesCenter / self.totalMass
+		if body.size > self.maxRadius:
+			self.maxRadius = body.size
+		return True
+
+	def __insert_children(self, body):
+		# Insert into the first child containing the body only, a body on a shared edge would otherwise be counted in the mass of every child
+		if not any(child.insert(body) for child in self.children):
+			self.stray.append(body)
+
+	def build(self, bodies):
+		"""
+		Clear the tree and insert all given bodies.
+
+		:param bodies: bodies to insert
+		:return: None
+		"""
+
+		self.divided = False
+		self.nw, self.ne, self.sw, self.se = None, None, None, None
+		self.children = [None, None, None, None]
+		self.bodies = []
+		self._leafArrays = None
+		self.stray = []
+		self.bodiesCenter = Vector2(0, 0)
+		self.totalMass = 0
+		self.centerOfMass = Vector2(0, 0)
+		self.maxRadius = 0
+
+		self.outside = [body for body in bodies if self.insert(body) is False]
+		self.bodyCount = len(bodies)
+
+	def refit(self, bodies, rebuildThreshold: float = 0.1) -> bool:
+		"""
+		Update the tree after the bodies have moved, instead of rebuilding it from scratch.
+		Only bodies that left their leaf are moved, and the mass of every node is recomputed bottom-up.
+		The tree is fully rebuilt if bodies were added or removed, or if too many bodies left their leaf.
+
+		:param bodies: the bodies contained in the tree
+		:param rebuildThreshold: fraction of bodies leaving their leaf above which the tree is rebuilt (default: 0.1)
+		:return: True if the tree was rebuilt, False if it was refitted
+		"""
+
+		if len(bodies) != self.bodyCount:
+			self.build(bodies)
+			return True
+
+		escaped = {}
+		self.__remove_escaped(escaped)
+
+		if len(escaped) > rebuildThreshold * len(bodies):
+			self.build(bodies)
+			return True
+
+		outside, self.outside = self.outside, []
+		for body in list(escaped.values()) + outside:
+			if self.insert(body) is False:
+				self.outside.append(body)
+
+		self.__update_mass()
+		return False
+
+	def __remove_escaped(self, escaped: dict):
+		"""
+		Remove all bodies that are no longer inside their leaf.
+
+		:param escaped: dictionary to collect the removed bodies in (by id, as a body can be in several leaves)
+		:return: None
+		"""
+
+		for body in self.stray:
+			escaped[id(body)] = body
+		self.stray = []
+
+		if self.divided:
+			for child in self.children:
+				child.__remove_escaped(escaped)
+		elif self.bodies:
+			remaining = []
+			for body in self.bodies:
+				if self.contains_point(body.position):
+					remaining.append(body)
+				else:
+					escaped[id(body)] = body
+
+			self.bodies = remaining
+			self._leafArrays = None  # The bodies have moved
+
+	def __update_mass(self) -> int:
+		"""
+		Recompute the mass and center of mass bottom-up, collapsing nodes that no longer need to be divided.
+
+		:return: The amount of bodies in this node
+		"""
+
+		if not self.divided:
+			self.bodiesCenter = Vector2(0, 0)
+			self.totalMass = 0
+			for body in self.bodies:
+				self.bodiesCenter += body.position * body.mass
+				self.totalMass += body.mass
+
+			self.centerOfMass = self.bodiesCenter / self.totalMass if self.totalMass else Vector2(0, 0)
+			self.maxRadius = max((body.size for body in self.bodies), default=0)
+			self._leafArrays = None
+			return len(self.bodies)
+
+		count = sum(child.__update_mass() for child in self.children)
+
+		if count + len(self.stray) <= self.leafCapacity:
+			# Collapse into a leaf, keeping the remaining bodies (once, as bodies on a shared edge are in several children)
+			remaining = {}
+			for body in [body for child in self.children for body in child.bodies] + self.stray:
+				remaining[id(body)] = body
+
+			self.bodies = list(remaining.values())
+			self.stray = []
+			self.divided = False
+			self.nw, self.ne, self.sw, self.se = None, None, None, None
+			self.children = [None, None, None, None]
+			return self.__update_mass()
+
+		self.bodiesCenter = Vector2(0, 0)
+		self.totalMass = 0
+		for child in self.children:
+			self.bodiesCenter += child.bodiesCenter
+			self.totalMass += child.totalMass
+		for body in self.stray:
+			self.bodiesCenter += body.position * body.mass
+			self.totalMass += body.mass
+
+		self.centerOfMass = self.bodiesCenter / self.totalMass if self.totalMass else Vector2(0, 0)
+		self.maxRadius = max([child.maxRadius for child in self.children] + [body.size for body in self.stray])
+		return count + len(self.stray)
 
 	def collide(self, body: 'Body'):
 		if not self.contains_body(body):
 			return False
 		if not self.divided:
-			if self.body is None or self.body == body:
-				return False
-			else:
-				body.collide(self.body)
+			for other in self.bodies:
+				if other is not body:
+					body.collide(other)
 		else:
 			for child in self.children:
 				child.collide(body)
 
+	def collision_pairs(self, bodies, indices: np.ndarray = None) -> tuple:
+		"""
+		Find all pairs of touching bodies in the tree. Unlike collide, every pair is found once instead of once from each body.
+
+		:param bodies: system of the bodies in the tree
+		:param indices: index array of the only bodies to find the touching bodies of, e.g. to check slow bodies less often (default: all bodies)
+		:return: Tuple of two index arrays (i, j) with i < j
+		"""
+
+		positions, radii = bodies.positions, bodies.radii
+		maxSize = radii.max() if len(radii) else 0
+		first, second = [], []
+		visited = 0
+
+		for index in (range(len(bodies)) if indices is None else indices.tolist()):
+			x, y = positions[index]
+			size = radii[index] + maxSize  # Every touching body has its center within this distance, whichever node it is in
+
+			stack = [self]
+			while stack:
+				node = stack.pop()
+				visited += 1
+				left, top, width, height = node.boundary
+				if x + size <= left or x - size >= left + width or y - size >= top or y + size <= top - height:
+					continue
+
+				# Only pair with bodies of a higher index, the other body finds the pair from its side (if it is checked too)
+				if indices is None:
+					others = [other.index for other in (node.stray if node.divided else node.bodies) if other.index > index]
+				else:
+					others = [other.index for other in (node.stray if node.divided else node.bodies) if other.index != index]
+				first.extend([index] * len(others))
+				second.extend(others)
+
+				if node.divided:
+					stack.extend(node.children)
+
+		# Bodies on a shared edge are in several leaves, and two checked bodies find their pair from both sides
+		pairs = np.array([first, second], dtype=np.int64).reshape(2, -1)
+		if indices is not None:
+			pairs = np.sort(pairs, axis=0)
+		pairs = np.unique(pairs, axis=1)
+		i, j = pairs[0], pairs[1]
+
+		displacement = positions[i] - positions[j]
+		totSize = radii[i] + radii[j]
+		touching = np.einsum('ij,ij->i', displacement, displacement) <= totSize * totSize  # Same test as Body.is_colliding
+		i, j = i[touching], j[touching]
+
+		self.counters['collision nodes'] += visited
+		self.counters['candidate pairs'] += len(touching)
+		self.counters['collision pairs'] += len(i)
+		return i, j
+
 	def gravity(self, body: 'Body', theta: float, g: float):
 		if not self.divided:
-			if self.body is None or self.body == body:
-				return
-			else:
+			if len(self.bodies) == 1:
+				other = self.bodies[0]
+				if other is body:
+					return
+
 				# NOTE: This should be a call to the body's gravity function, but because of optimizations, it's not
-				disp = self.body.position - body.position
-				totSize = self.body.size + body.size
+				disp = other.position - body.position
+				totSize = other.size + body.size
 
-				body.acceleration += disp.normalize() * self.body.mass / max(disp.magnitude_squared(), totSize*totSize) * g
-				return
+				body.acceleration += disp.normalize() * other.mass / max(disp.magnitude_squared(), totSize*totSize) * g
+			elif self.bodies:
+				body.acceleration += self.__leaf_gravity(body, g)
+			return
 
 		if self.totalMass == 0:
 			return
 
 		# Optimization: if the bodies are far enough, approximate the force by all bodies in the quadtree
-		pos = self.bodiesCenter / self.totalMass
+		pos = self.centerOfMass
 		totMass = self.totalMass
 		displacement = pos - body.position
 		if self.boundary.width * self.boundary.width / displacement.magnitude_squared() < theta:
@@ -95,12 +314,400 @@ class QuadTree:
 			body.acceleration += displacement.normalize() * totMass / displacement.magnitude_squared() * g
 			return
 
+		for other in self.stray:  # Bodies between the children are not in any of them
+			disp = other.position - body.position
+			if other is not body and disp.magnitude_squared() > 0:
+				totSize = other.size + body.size
+				body.acceleration += disp.normalize() * other.mass / max(disp.magnitude_squared(), totSize*totSize) * g
+
 		for child in self.children:
 			child.gravity(body, theta, g)
 
-	def draw(self, app: App):
-		app.draw_rect((self.boundary.x, self.boundary.y), self.boundary.width, self.boundary.height, Colors.MAGENTA, 1, fromCamera=True)
+	def leaves(self):
+		"""
+		Iterate over all non-empty leaves of the tree.
+
+		:return: Generator of leaf nodes
+		"""
 
 		if self.divided:
 			for child in self.children:
-				child.draw(app)
+				yield from child.leaves()
+		elif self.bodies:
+			yield self
+
+	def group_gravity(self, bodies, theta: float, g: float, indices: np.ndarray = None):
+		"""
+		Apply gravity to all given bodies by walking the tree once per group of bodies instead of once per body.
+		Every leaf is a group: it builds one interaction list of accepted nodes and bodies that is evaluated as a single NumPy batch.
+		Bodies not in any leaf (outside the boundary or between children) are walked as groups of one.
+
+		:param bodies: the bodies to apply gravity to
+		:param theta: opening criterion, a node is approximated if (width / distance)^2 < theta for every body in the group
+		:param g: gravitational constant
+		:param indices: index array of the only bodies to apply gravity to, all bodies still attract them (default: all bodies)
+		:return: None
+		"""
+
+		self.__group_gravity(bodies, theta, g, indices, None)
+
+	def group_gravity_pairs(self, bodies, theta: float, g: float) -> tuple:
+		"""
+		Apply gravity like group_gravity and find all pairs of touching bodies like collision_pairs, in the same walks.
+		The distances to the bodies of the opened leaves are already computed for gravity, so touching bodies among them come for free.
+		Only accepted nodes that a body could still touch (by the largest radius in the node) are walked further, for contacts only.
+
+		:param bodies: the bodies in the tree, to apply gravity to
+		:param theta: opening criterion, a node is approximated if (width / distance)^2 < theta for every body in the group
+		:param g: gravitational constant
+		:return: Tuple of two index arrays (i, j) with i < j
+		"""
+
+		contacts = []
+		self.__group_gravity(bodies, theta, g, None, contacts)
+
+		# Every pair is found from both of its bodies
+		pairs = np.concatenate(contacts, axis=1) if contacts else np.zeros((2, 0), dtype=np.int64)
+		pairs = np.unique(np.sort(pairs, axis=0), axis=1)
+		self.counters['collision pairs'] += pairs.shape[1]
+		return pairs[0], pairs[1]
+
+	def __group_gravity(self, bodies, theta: float, g: float, indices: np.ndarray, contacts: list):
+		"""
+		Walk the tree once per group of bodies, see group_gravity.
+
+		:param bodies: the bodies to apply gravity to
+		:param theta: opening criterion
+		:param g: gravitational constant
+		:param indices: index array of the only bodies to apply gravity to (None: all bodies)
+		:param contacts: list to add (2, k) index arrays of touching pairs to (None: no contacts)
+		:return: None
+		"""
+
+		active = None
+		if indices is not None:
+			active = np.zeros(len(bodies), dtype=bool)
+			active[indices] = True
+
+		grouped = set()
+		for leaf in self.leaves():
+			# Bodies on a shared edge are in several leaves
+			rows = [row for row, body in enumerate(leaf.bodies) if id(body) not in grouped and (active is None or active[body.index])]
+			if rows:
+				group = [leaf.bodies[row] for row in rows]
+				grouped.update(id(body) for body in group)
+				positions, masses, radii = leaf.leaf_arrays()
+				self.__group_walk(group, positions[rows], radii[rows], leaf, theta, g, contacts)
+
+		for body in bodies:
+			if id(body) not in grouped and (active is None or active[body.index]):
+				self.__group_walk([body], np.array([body.system.positions[body.index]]), np.array([body.size]), None, theta, g, contacts)
+
+	def __group_walk(self, group: list, positions: np.ndarray, radii: np.ndarray, leaf: 'QuadTree', theta: float, g: float,
+	                 contacts: list = None):
+		"""
+		Walk the tree once for a group of bodies and apply the gravity of the resulting interaction list.
+
+		:param group: the bodies to apply gravity to
+		:param positions: (k, 2) positions of the bodies in the group
+		:param radii: (k,) radii of the bodies in the group
+		:param leaf: the leaf of the group, its bodies interact directly (None for a group outside the tree)
+		:param theta: opening criterion
+		:param g: gravitational constant
+		:param contacts: list to add a (2, m) index array of the touching pairs of the group to (default: None, no contacts)
+		:return: None
+		"""
+
+		(lowX, lowY), (highX, highY) = positions.min(axis=0).tolist(), positions.max(axis=0).tolist()
+		nodes, leaves, strays = [], [leaf] if leaf is not None else [], []
+		nearby = []  # Accepted nodes the group could still touch a body in
+		reach = float(radii.max())
+		visited = 0
+
+		stack = [self]
+		while stack:
+			node = stack.pop()
+			visited += 1
+			if node is leaf:
+				continue
+
+			if not node.divided:
+				if node.bodies:
+					leaves.append(node)
+				continue
+
+			if node.totalMass == 0:
+				continue
+
+			# Accept the node only if it is far enough from the closest point of the group's bounding box
+			center = node.centerOfMass
+			dx = max(lowX - center.x, 0, center.x - highX)
+			dy = max(lowY - center.y, 0, center.y - highY)
+			if node.boundary.width * node.boundary.width < theta * (dx * dx + dy * dy):
+				nodes.append((center.x, center.y, node.totalMass))
+				if contacts is not None:
+					# The same test as __near, inlined as most accepted nodes are tested
+					left, top, width, height = node.boundary
+					size = node.maxRadius + reach
+					if left - size <= highX and left + width + size >= lowX and top + size >= lowY and top - height - size <= highY:
+						nearby.append(node)
+			else:
+				stack.extend(node.children)
+				strays.extend(node.stray)  # Bodies between the children are not in any of them
+
+		accelerations = np.zeros((len(positions), 2))
+		self.counters['gravity nodes'] += visited
+		self.counters['interactions'] += len(positions) * (len(nodes) + len(strays) + sum(len(node.bodies) for node in leaves))
+
+		# Accepted nodes: approximated by their center of mass
+		if nodes:
+			nodes = np.array(nodes)
+			dx = nodes[None, :, 0] - positions[:, 0, None]
+			dy = nodes[None, :, 1] - positions[:, 1, None]
+			distSquared = dx * dx + dy * dy
+			scale = g * nodes[None, :, 2] / (distSquared * np.sqrt(distSquared))
+			accelerations[:, 0] += (scale * dx).sum(axis=1)
+			accelerations[:, 1] += (scale * dy).sum(axis=1)
+
+		groupIndices = np.array([body.index for body in group], dtype=np.int64) if contacts is not None else None
+
+		# Bodies in nearby leaves (and in the group's own leaf): direct sum with softening
+		if strays:
+			leaves.append(None)
+		if leaves:
+			sources = [node.leaf_arrays() if node is not None else
+			           (np.array([body.system.positions[body.index] for body in strays]), np.array([body.mass for body in strays]),
+			            np.array([body.size for body in strays])) for node in leaves]
+			sourcePositions = np.concatenate([source[0] for source in sources])
+			sourceMasses = np.concatenate([source[1] for source in sources])
+			sourceRadii = np.concatenate([source[2] for source in sources])
+
+			dx = sourcePositions[None, :, 0] - positions[:, 0, None]
+			dy = sourcePositions[None, :, 1] - positions[:, 1, None]
+			distSquared = dx * dx + dy * dy
+			minDist = sourceRadii[None, :] + radii[:, None]
+			denominator = np.maximum(distSquared, minDist * minDist) * np.sqrt(distSquared)
+
+			# The body itself (and bodies at the exact same position) do not pull on the body
+			scale = np.divide(g * sourceMasses[None, :], denominator, out=np.zeros_like(denominator), where=distSquared > 0)
+			accelerations[:, 0] += (scale * dx).sum(axis=1)
+			accelerations[:, 1] += (scale * dy).sum(axis=1)
+
+			if contacts is not None:
+				# Same test as Body.is_colliding on the distances gravity needed anyway, bodies at the same position (the body itself)
+				# have no direction to collide in
+				touching = (distSquared <= minDist * minDist) & (distSquared > 0)
+				if touching.any():
+					sourceIndices = np.concatenate([node.leaf_indices() if node is not None else
+					                                np.array([body.index for body in strays], dtype=np.int64) for node in leaves])
+					self.__add_contacts(contacts, groupIndices, sourceIndices, touching)
+
+		for body, acceleration in zip(group, accelerations):
+			body.system.accelerations[body.index] += acceleration
+
+		if nearby:
+			self.__nearby_contacts(contacts, group[0].system, groupIndices, positions, radii, (lowX, lowY, highX, highY), reach, nearby)
+
+	@staticmethod
+	def __near(node: 'QuadTree', lowX: float, lowY: float, highX: float, highY: float, reach: float) -> bool:
+		"""
+		Check if a body of a group could touch a body in a node, i.e. if the node grown by the largest radius in it and in the
+		group overlaps the bounding box of the centers of the group.
+
+		:param node: the node
+		:param lowX: the left edge of the bounding box of the group
+		:param lowY: the bottom edge of the bounding box of the group
+		:param highX: the right edge of the bounding box of the group
+		:param highY: the top edge of the bounding box of the group
+		:param reach: the largest radius in the group
+		:return: True if a body of the group could touch a body in the node
+		"""
+
+		left, top, width, height = node.boundary
+		size = node.maxRadius + reach
+		return left - size <= highX and left + width + size >= lowX and top + size >= lowY and top - height - size <= highY
+
+	def __nearby_contacts(self, contacts: list, system, groupIndices: np.ndarray, positions: np.ndarray, radii: np.ndarray,
+	                      box: tuple, reach: float, nearby: list):
+		"""
+		Find the bodies touching a group in the accepted nodes the group could still touch a body in.
+
+		:param contacts: list to add a (2, m) index array of the touching pairs to
+		:param system: system of the bodies in the tree
+		:param groupIndices: (k,) indices of the bodies of the group
+		:param positions: (k, 2) positions of the bodies of the group
+		:param radii: (k,) radii of the bodies of the group
+		:param box: the (left, bottom, right, top) bounding box of the centers of the group
+		:param reach: the largest radius in the group
+		:param nearby: the nodes
+		:return: None
+		"""
+
+		candidates = []
+		stack = list(nearby)
+		while stack:
+			node = stack.pop()
+			self.counters['collision nodes'] += 1
+			if not self.__near(node, *box, reach):
+				continue
+
+			if node.divided:
+				candidates.extend(body.index for body in node.stray)
+				stack.extend(node.children)
+			else:
+				candidates.extend(node.leaf_indices().tolist())
+
+		if candidates:
+			candidates = np.array(candidates, dtype=np.int64)
+			displacement = system.positions[candidates][None, :, :] - positions[:, None, :]
+			distSquared = np.einsum('ijk,ijk->ij', displacement, displacement)
+			minDist = system.radii[candidates][None, :] + radii[:, None]
+			touching = (distSquared <= minDist * minDist) & (distSquared > 0)
+			if touching.any():
+				self.__add_contacts(contacts, groupIndices, candidates, touching)
+
+	@staticmethod
+	def __add_contacts(contacts: list, groupIndices: np.ndarray, sourceIndices: np.ndarray, touching: np.ndarray):
+		"""
+		Add the touching pairs of a group and its sources.
+
+		:param contacts: list to add a (2, m) index array of the touching pairs to
+		:param groupIndices: (k,) indices of the bodies of the group
+		:param sourceIndices: (n,) indices of the sources
+		:param touching: (k, n) boolean matrix of touching bodies
+		:return: None
+		"""
+
+		row, column = np.nonzero(touching)
+		contacts.append(np.stack((groupIndices[row], sourceIndices[column])))
+
+	def leaf_arrays(self):
+		"""
+		Get the positions, masses and radii of the bodies in this leaf as arrays.
+		The arrays are cached until the leaf changes or the tree is refitted.
+
+		:return: Tuple of (k, 2) positions, (k,) masses and (k,) radii
+		"""
+
+		if self._leafArrays is None:
+			positions = np.array([body.system.positions[body.index] for body in self.bodies])
+			masses = np.array([body.mass for body in self.bodies])
+			radii = np.array([body.size for body in self.bodies])
+			indices = np.array([body.index for body in self.bodies], dtype=np.int64)
+			self._leafArrays = positions, masses, radii, indices
+
+		return self._leafArrays[:3]
+
+	def leaf_indices(self) -> np.ndarray:
+		"""
+		Get the indices of the bodies in this leaf, in the order of leaf_arrays.
+
+		:return: (k,) index array
+		"""
+
+		self.leaf_arrays()
+		return self._leafArrays[3]
+
+	def __leaf_gravity(self, body: 'Body', g: float) -> Vector2:
+		"""
+		Calculate the acceleration of a body from all bodies in this leaf as a small vectorized direct sum.
+
+		:param body: body to calculate the acceleration of
+		:param g: gravitational constant
+		:return: Vector2 representing the acceleration
+		"""
+
+		positions, masses, radii = self.leaf_arrays()
+		x, y = body.system.positions[body.index]
+
+		dx, dy = positions[:, 0] - x, positions[:, 1] - y
+		distSquared = dx * dx + dy * dy
+		minDist = radii + body.size
+
+		# The body itself (and bodies at the exact same position) do not pull on the body
+		valid = distSquared > 0
+		scale = g * masses[valid] / (np.maximum(distSquared[valid], minDist[valid] ** 2) * np.sqrt(distSquared[valid]))
+		return Vector2(float(np.dot(scale, dx[valid])), float(np.dot(scale, dy[valid])))
+
+	@staticmethod
+	def __view(app: App) -> tuple:
+		"""
+		Get the part of the world visible through the main camera of an application.
+
+		:param app: the application
+		:return: Tuple of the left, top, right and bottom edge
+		"""
+
+		camera = app.mainCamera
+		halfWidth, halfHeight = app.windowSize.x / 2 / camera.zoom, app.windowSize.y / 2 / camera.zoom
+		return camera.position.x - halfWidth, camera.position.y + halfHeight, camera.position.x + halfWidth, camera.position.y - halfHeight
+
+	def draw(self, app: App, pixelSize: float = 4):
+		"""
+		Draw the nodes of the tree, except nodes outside the view and the children of nodes smaller than pixelSize on screen.
+
+		:param app: app to draw the tree in
+		:param pixelSize: the size in pixels below which the children of a node are not drawn (default: 4)
+		:return: None
+		"""
+
+		left, top, right, bottom = self.__view(app)
+		zoom = app.mainCamera.zoom
+
+		stack = [self]
+		while stack:
+			node = stack.pop()
+			x, y, width, height = node.boundary
+			if x > right or x + width < left or y < bottom or y - height > top:
+				continue
+
+			app.draw_rect((x, y), width, height, Colors.MAGENTA, 1, fromCamera=True)
+			if node.divided and width * zoom >= pixelSize:
+				stack.extend(node.children)
+
+	def draw_bodies(self, app: App, bodies, pixelSize: float = 2):
+		"""
+		Draw the bodies in the tree with a level of detail: a node smaller than pixelSize on screen is drawn as a single point at its
+		center of mass, brighter the heavier it is. Nodes outside the view are skipped, so the cost depends on the resolution of
+		the window instead of the amount of bodies. Bodies at least pixelSize large on screen are always drawn as themselves.
+
+		:param app: app to draw the bodies in
+		:param bodies: system of the bodies in the tree
+		:param pixelSize: the size in pixels below which a node is drawn as one body (default: 2)
+		:return: None
+		"""
+
+		left, top, right, bottom = self.__view(app)
+		zoom = app.mainCamera.zoom
+		indices = [body.index for body in self.outside]
+		aggregates = []
+
+		stack = [self]
+		while stack:
+			node = stack.pop()
+			x, y, width, height = node.boundary
+			if node.totalMass == 0 or x > right or x + width < left or y < bottom or y - height > top:
+				continue
+
+			if width * zoom < pixelSize:
+				aggregates.append((node.centerOfMass.x, node.centerOfMass.y, node.totalMass))
+			elif node.divided:
+				indices.extend(body.index for body in node.stray)
+				stack.extend(node.children)
+			else:
+				indices.extend(body.index for body in node.bodies)
+
+		if indices:
+			indices = np.array(indices)
+			app.draw_circles(bodies.positions[indices], bodies.radii[indices], bodies.colors[indices], fromCamera=True)
+
+		if aggregates:
+			aggregates = np.array(aggregates)
+			masses = aggregates[:, 2]
+			brightness = 64 + 191 * np.log1p(masses) / np.log1p(masses.max())  # Heavier nodes are brighter
+			radii = np.minimum(np.sqrt(masses), 0.5 / zoom)  # At most a pixel, so they are written straight into the pixels
+			app.draw_circles(aggregates[:, :2], radii, np.repeat(brightness[:, None], 3, axis=1), fromCamera=True)
+
+			large = np.flatnonzero(bodies.radii * zoom >= pixelSize)
+			if len(large):
+				app.draw_circles(bodies.positions[large], bodies.radii[large], bodies.colors[large], fromCamera=True)
@@ -0,0 +1,327 @@
+from Engine.Utils.utils import Vector2, Rect
+from Engine.Core.profiler import Profiler
+
+from body import BodySystem
+from quadtree import QuadTree, COUNTERS
+from linearquadtree import LinearQuadTree
+from multigrid import MultiLevelGrid
+from direct import direct_gravity
+from fmm import fmm_gravity
+from parallel import ParallelGravity
+from integrators import Integrator, Euler, INTEGRATORS
+
+from time import perf_counter
+from typing import Callable
+import json
+import os
+
+import numpy as np
+
+
+class Simulation:
+	"""
+	A headless n-body simulation owning the bodies, the quadtree and the step logic.
+	It needs no window and steps as fast as it can, a viewer (see main.py) can be attached to draw it and step it once per frame.
+
+	Attributes:
+		bodies: The system of bodies being simulated.
+		bounds: The rectangle the bodies bounce off and the boundary of the quadtree.
+		quadTree: The quadtree used for gravity.
+		collisionGrid: The multi-level grid used for collision detection.
+		theta: The opening criterion of the quadtree.
+		g: The gravitational constant.
+		integrator: The integrator advancing the bodies.
+		rng: The random generator of the simulation, saved in checkpoints.
+		profiler: Times the phases of every step and counts the work of the quadtree, disabled by default.
+		collisionInterval: Slow bodies and bodies outside the focus are only checked for collisions every this many steps (1: every step).
+		focus: The (left, top, right, bottom) region outside which bodies are thinned, e.g. the view of a viewer (None: everywhere).
+		steps: The amount of steps taken.
+		time: The simulated time.
+
+	Methods:
+		disc: Creates the rotating disc around a heavy center body shown by main.py.
+		accelerate: Applies gravity to the bodies at their current positions.
+		step: Advances the simulation one step.
+		run: Advances the simulation a given amount of steps, uncapped.
+		save: Writes a checkpoint of the full state.
+		load: Restores a simulation from a checkpoint.
+	"""
+
+	def __init__(self, bodies: BodySystem, bounds: Rect, theta: float = 1, g: float = 5, leafCapacity: int = 8, integrator: Integrator = None,
+	             rng: np.random.Generator = None):
+		"""
+		Initialize the simulation and build the quadtree of the bodies.
+
+		:param bodies: system of bodies to simulate
+		:param bounds: the rectangle the bodies bounce off, also the boundary of the quadtree
+		:param theta: opening criterion of the quadtree, a node is approximated if (width / distance)^2 < theta (default: 1)
+		:param g: gravitational constant (default: 5)
+		:param leafCapacity: the amount of bodies a leaf of the quadtree can hold before it is subdivided (default: 8)
+		:param integrator: the integrator advancing the bodies (default: Euler)
+		:param rng: the random generator of the simulation (default: a randomly seeded one)
+		"""
+
+		self.bodies = bodies
+		self.bounds = Rect(bounds)
+		self.theta = theta
+		self.g = g
+		self.integrator = integrator if integrator is not None else Euler()
+		self.rng = rng if rng is not None else np.random.default_rng()
+		self.steps = 0
+		self.time = 0.0
+		self.profiler = Profiler()  # A viewer shares its own profiler, so the phases of a step show up in its overlay
+		self.collisionInterval = 1
+		self.focus = None
+
+		# The quadtree is built once and then refitted every step as the bodies move
+		self.quadTree = QuadTree(self.bounds, leafCapacity=leafCapacity)  # Bucketed leaves keep the tree shallow around the dense center
+		self.quadTree.build(self.bodies)
+		self.__fittedPositions = self.bodies.positions.copy()
+		self.collisionGrid = MultiLevelGrid()
+
+	@classmethod
+	def disc(cls, size: tuple, bodies: int = 300, maxSpeed: float = 40, minMass: int = 10, maxMass: int = 1000,
+	         scale: float = 10, boundScale: float = 100, seed: int = None, **kwargs) -> 'Simulation':
+		"""
+		Create bodies spinning around a large center body.
+
+		:param size: the size of the view the bodies are spread over
+		:param bodies: the amount of bodies, not counting the center body (default: 300)
+		:param maxSpeed: the initial speed of the bodies (default: 40)
+		:param minMass: the minimum mass of a body (default: 10)
+		:param maxMass: the maximum mass of a body (default: 1000)
+		:param scale: how much smaller the area the bodies start in is than the bounds (default: 10)
+		:param boundScale: how much larger the bounds are than the view (default: 100)
+		:param seed: seed of the random initial conditions (default: None, random)
+		:param kwargs: passed on to the simulation
+		:return: The simulation
+		"""
+
+		width, height = size
+		bounds = Rect(-width / 2 * boundScale, height / 2 * boundScale, width * boundScale, height * boundScale)
+		rng = np.random.default_rng(seed)
+
+		system = BodySystem(capacity=bodies + 1)
+
+		for _ in range(bodies):
+			pos = Vector2(int(rng.integers(bounds.x / scale, (bounds.x + bounds.width) / scale)),
+			              int(rng.integers((bounds.y - bounds.height) / scale, bounds.y)) / scale)
+
+			mass = int(rng.integers(minMass, maxMass))
+
+			system.add(pos, mass)
+
+		# Give bodies initial velocity to spin around center
+		for body in system:
+			toCenter = -body.position.normalize()
+			body.velocity = Vector2(toCenter.y, -toCenter.x) * maxSpeed
+
+		system.add(Vector2(0, 0), 1000000, Vector2(0, 0))  # Large center body
+
+		return cls(system, bounds, rng=rng, **kwargs)
+
+	def __refit(self):
+		"""
+		Refit the quadtree to the current body positions, unless it already fits them.
+
+		:return: None
+		"""
+
+		positions = self.bodies.positions
+		if self.__fittedPositions.shape != positions.shape or not np.array_equal(self.__fittedPositions, positions):
+			# Refit the quadtree to the new body positions (rebuilds it if too many bodies changed leaf)
+			with self.profiler.phase("tree"):
+				self.quadTree.refit(self.bodies)
+			self.__fittedPositions = positions.copy()
+
+	def __collision_checked(self, dt: float) -> np.ndarray:
+		"""
+		Get the bodies to check for collisions this step when collisions are thinned. Bodies in the focus that are fast enough to
+		move their own radius before their next check are checked every step, the other (distant or slow) bodies every
+		collisionInterval-th step, in turns.
+
+		:param dt: the time step
+		:return: Index array of the bodies
+		"""
+
+		bodies, interval = self.bodies, self.collisionInterval
+		positions, velocities = bodies.positions, bodies.velocities
+
+		always = np.einsum('ij,ij->i', velocities, velocities) * (dt * interval) ** 2 > bodies.radii ** 2
+		if self.focus is not None:
+			left, top, right, bottom = self.focus
+			always &= (left <= positions[:, 0]) & (positions[:, 0] <= right) & (bottom <= positions[:, 1]) & (positions[:, 1] <= top)
+
+		return np.flatnonzero(always | (np.arange(len(bodies)) % interval == self.steps % interval))
+
+	def accelerate(self, bodies: BodySystem, indices: np.ndarray = None):
+		"""
+		Apply gravity to the bodies at their current positions, called by the integrator for every force evaluation.
+
+		:param bodies: the system of bodies to apply gravity to (the bodies of the simulation)
+		:param indices: index array of the only bodies to apply gravity to, all bodies still attract them (default: all bodies)
+		:return: None
+		"""
+
+		self.__refit()
+
+		# GRAVITY
+		"""
+		# DIRECT GRAVITY (exact, vectorized O(N^2))
+		direct_gravity(bodies, self.g)
+		"""
+
+		"""
+		# LINEAR QUADTREE GRAVITY (array-backed Barnes-Hut)
+		LinearQuadTree(self.bounds, bodies.positions, bodies.masses, bodies.radii).gravity(bodies, self.theta, self.g)
+		"""
+
+		"""
+		# PARALLEL LINEAR QUADTREE GRAVITY (Barnes-Hut on all cores, create self.parallelGravity = ParallelGravity(self.bounds) once)
+		self.parallelGravity.gravity(bodies, self.theta, self.g)
+		"""
+
+		"""
+		# FAST MULTIPOLE GRAVITY (O(N), for very large amounts of bodies)
+		fmm_gravity(bodies, self.g, order=6)
+		"""
+
+		"""
+		# QUADTREE GRAVITY (one tree walk per body)
+		for body in bodies:
+			self.quadTree.gravity(body, self.theta, self.g)
+		"""
+
+		# GROUPED QUADTREE GRAVITY (one tree walk per leaf)
+		with self.profiler.phase("gravity"):
+			self.quadTree.group_gravity(bodies, self.theta, self.g, indices)
+
+	def step(self, dt: float = 1):
+		"""
+		Advance the simulation one step: collisions, then gravity and integration.
+
+		:param dt: the time step (default: 1)
+		:return: None
+		"""
+
+		self.__refit()
+
+		# COLLISION DETECTION
+		"""
+		for i, body in enumerate(self.bodies):
+			# NAIVE COLLISION DETECTION
+			for body2 in self.bodies[i:]:
+				if body != body2:
+					body.collide(body2)
+
+			body.collide(self.bounds)
+		"""
+
+		with self.profiler.phase("collision"):
+			checked = self.__collision_checked(dt) if self.collisionInterval > 1 else None
+
+			"""
+			# QUADTREE COLLISION DETECTION (every pair once, resolved in batches, every query widened by the largest body)
+			first, second = self.quadTree.collision_pairs(self.bodies, checked)
+			"""
+
+			# MULTI-LEVEL GRID COLLISION DETECTION (every body on the level of its size, the same cost for any mix of radii)
+			self.collisionGrid.build(self.bodies.positions, self.bodies.radii)
+			first, second = self.collisionGrid.colliding_pairs(checked)
+			self.profiler.count("candidate pairs", self.collisionGrid.candidates)
+			self.profiler.count("collision pairs", len(first))
+
+			self.bodies.collide_pairs(first, second)
+			self.bodies.collide_bounds(self.bounds)
+
+		# UPDATE BODIES
+		with self.profiler.phase("integration"):  # Without the gravity and tree phases inside it
+			self.integrator.step(self.bodies, dt, self.accelerate)
+
+		counters = self.quadTree.counters
+		for name in COUNTERS:
+			self.profiler.count(name, counters[name])
+			counters[name] = 0
+
+		self.steps += 1
+		self.time += dt
+
+	def run(self, steps: int, dt: float = 1, callback: Callable[['Simulation'], None] = None) -> float:
+		"""
+		Advance the simulation a given amount of steps as fast as possible, without a window or frame rate cap.
+
+		:param steps: the amount of steps to take
+		:param dt: the time step (default: 1)
+		:param callback: called with the simulation after every step, e.g. to save its state (default: None)
+		:return: The wall-clock time the steps took in seconds
+		"""
+
+		start = perf_counter()
+		for _ in range(steps):
+			self.step(dt)
+			if callback is not None:
+				callback(self)
+
+		return perf_counter() - start
+
+	def save(self, path: str):
+		"""
+		Write the full state of the simulation to a compact binary (npz) file: the body arrays, the step counter, the random
+		generator, the bounds, the settings and the state of the integrator. The quadtree is rebuilt on load.
+		The file is written next to the path and then moved over it, so a crash while saving never leaves a broken checkpoint.
+
+		:param path: the path of the checkpoint
+		:return: None
+		"""
+
+		bodies = self.bodies
+		arrays = {'positions': bodies.positions, 'velocities': bodies.velocities, 'accelerations': bodies.accelerations,
+		          'masses': bodies.masses, 'radii': bodies.radii, 'heat': bodies.heat, 'colors': bodies.colors,
+		          'bounds': np.array(tuple(self.bounds)), 'theta': self.theta, 'g': self.g, 'leafCapacity': self.quadTree.leafCapacity,
+		          'steps': self.steps, 'time': self.time, 'rng': json.dumps(self.rng.bit_generator.state)}
+
+		names = {integrator: name for name, integrator in INTEGRATORS.items()}
+		if type(self.integrator) not in names:
+			raise ValueError(f"Cannot checkpoint unregistered integrator {type(self.integrator).__name__}")
+		arrays['integrator'] = names[type(self.integrator)]
+		for name, value in self.integrator.state().items():
+			if value is not None:  # Missing attributes are left at their default (None) on load
+				arrays['integrator.' + name] = value
+
+		temporary = path + '.tmp'
+		with open(temporary, 'wb') as file:
+			np.savez(file, **arrays)
+			file.flush()
+			os.fsync(file.fileno())
+		os.replace(temporary, path)
+
+	@classmethod
+	def load(cls, path: str) -> 'Simulation':
+		"""
+		Restore a simulation from a checkpoint written by Simulation.save.
+
+		:param path: the path of the checkpoint
+		:return: The simulation, continuing where the checkpoint was saved
+		"""
+
+		with np.load(path, allow_pickle=False) as data:
+			bodies = BodySystem.from_arrays(data['positions'], data['masses'], data['velocities'])
+			bodies.accelerations = data['accelerations']
+			bodies.radii[...] = data['radii']
+			bodies.heat[...] = data['heat']
+			bodies.colors[...] = data['colors']
+
+			state = json.loads(str(data['rng']))
+			rng = np.random.Generator(getattr(np.random, state['bit_generator'])())
+			rng.bit_generator.state = state
+
+			integrator = INTEGRATORS[str(data['integrator'])]()
+			integrator.load_state({name[len('integrator.'):]: data[name].item() if data[name].ndim == 0 else data[name]
+			                       for name in data.files if name.startswith('integrator.')})
+
+			simulation = cls(bodies, Rect(*data['bounds'].tolist()), float(data['theta']), float(data['g']), int(data['leafCapacity']),
+			                 integrator, rng)
+			simulation.steps = int(data['steps'])
+			simulation.time = float(data['time'])
+
+		return simulation
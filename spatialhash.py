@@ -0,0 +1,138 @@
+from Engine.Core.app import App
+from Engine.Utils.utils import Colors
+
+import numpy as np
+
+
+class SpatialHash:
+	"""
+	A uniform grid for finding colliding bodies (broad phase).
+	Every body is binned into all cells its bounding box overlaps with one sort of the cell keys, and candidate pairs are the bodies sharing a cell.
+	A pair sharing several cells is only reported by the cell at the corner of the overlap of their bounding boxes, so every pair is found once.
+
+	Attributes:
+		cellSize: The width and height of a cell.
+		order: Indices of the binned bodies sorted by their cell (a body is in it once for every cell it overlaps).
+		cells: The sorted keys of the non-empty cells.
+		start: Index of the first body of every cell in order.
+		count: The amount of bodies in every cell.
+
+	Methods:
+		build: Bins the bodies into the grid.
+		candidate_pairs: Finds all pairs of bodies sharing a cell.
+		colliding_pairs: Finds all pairs of bodies that are touching.
+		draw: Draws the non-empty cells of the grid.
+	"""
+
+	def __init__(self, cellSize: float = None):
+		"""
+		Initialize an empty spatial hash.
+
+		:param cellSize: the width and height of a cell (default: three times the mean radius of the bodies, computed on every build)
+		"""
+
+		self.fixedCellSize = cellSize
+		self.cellSize = cellSize
+		self.positions = np.zeros((0, 2))
+		self.radii = np.zeros(0)
+		self.order = np.zeros(0, dtype=np.int64)
+		self.cells = np.zeros(0, dtype=np.int64)
+		self.start = np.zeros(0, dtype=np.int64)
+		self.count = np.zeros(0, dtype=np.int64)
+		self.__low = np.zeros((0, 2), dtype=np.int64)
+		self.__origin = np.zeros(2, dtype=np.int64)
+		self.__rows = 1
+
+	def build(self, positions: np.ndarray, radii: np.ndarray):
+		"""
+		Bin all bodies into the grid.
+
+		:param positions: (N, 2) array of body positions
+		:param radii: (N,) array of body radii
+		:return: None
+		"""
+
+		self.positions = np.asarray(positions, dtype=float)
+		self.radii = np.asarray(radii, dtype=float)
+		if len(self.radii) == 0:
+			self.order = self.cells = self.start = self.count = np.zeros(0, dtype=np.int64)
+			return
+
+		self.cellSize = self.fixedCellSize or max(3 * float(self.radii.mean()), 1e-9)
+
+		# The range of cells overlapped by the bounding box of every body
+		low = np.floor((self.positions - self.radii[:, None]) / self.cellSize).astype(np.int64)
+		high = np.floor((self.positions + self.radii[:, None]) / self.cellSize).astype(np.int64)
+		self.__origin = low.min(axis=0)
+		low -= self.__origin
+		high -= self.__origin
+		self.__low = low
+		self.__rows = int(high[:, 1].max()) + 1
+
+		columns, rows = high[:, 0] - low[:, 0] + 1, high[:, 1] - low[:, 1] + 1
+		cellCount = columns * rows
+		body = np.repeat(np.arange(len(self.radii)), cellCount)
+		rank = self.__ranks(cellCount)
+		column = low[body, 0] + rank // rows[body]
+		row = low[body, 1] + rank % rows[body]
+
+		keys = column * self.__rows + row
+		sort = np.argsort(keys, kind='stable')
+		self.order = body[sort]
+		keys = keys[sort]
+
+		first = np.ones(len(keys), dtype=bool)
+		first[1:] = keys[1:] != keys[:-1]
+		self.start = np.flatnonzero(first)
+		self.cells = keys[self.start]
+		self.count = np.diff(np.append(self.start, len(keys)))
+
+	def candidate_pairs(self) -> tuple:
+		"""
+		Find all pairs of bodies sharing a cell, every pair is returned once.
+
+		:return: Tuple of two index arrays (i, j)
+		"""
+
+		# Every body with the bodies after it in the cell
+		sortedCell = np.repeat(np.arange(len(self.cells)), self.count)
+		rank = np.arange(len(self.order)) - np.repeat(self.start, self.count)
+		after = self.count[sortedCell] - rank - 1
+		entry = np.repeat(np.arange(len(self.order)), after)
+		other = entry + self.__ranks(after) + 1
+		i, j = self.order[entry], self.order[other]
+
+		# Only the cell at the low corner of the overlap of both bounding boxes reports the pair
+		corner = np.maximum(self.__low[i], self.__low[j])
+		owner = corner[:, 0] * self.__rows + corner[:, 1] == self.cells[sortedCell[entry]]
+		return i[owner], j[owner]
+
+	def colliding_pairs(self) -> tuple:
+		"""
+		Find all pairs of touching bodies (narrow phase on the candidate pairs), every pair is returned once.
+
+		:return: Tuple of two index arrays (i, j)
+		"""
+
+		i, j = self.candidate_pairs()
+		displacement = self.positions[i] - self.positions[j]
+		totSize = self.radii[i] + self.radii[j]
+		touching = np.einsum('ij,ij->i', displacement, displacement) <= totSize * totSize  # Same test as Body.is_colliding
+		return i[touching], j[touching]
+
+	@staticmethod
+	def __ranks(counts: np.ndarray) -> np.ndarray:
+		"""
+		Create the ranks 0..count-1 for every count, concatenated.
+
+		:param counts: array of counts
+		:return: array of ranks
+		"""
+
+		return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+	def draw(self, app: App):
+		column = self.cells // self.__rows + self.__origin[0]
+		row = self.cells % self.__rows + self.__origin[1]
+		for x, y in zip(column, row):
+			app.draw_rect((x * self.cellSize, (y + 1) * self.cellSize), self.cellSize, self.cellSize, Colors.MAGENTA, 1, fromCamera=True)
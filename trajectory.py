@@ -0,0 +1,204 @@
+from body import BodySystem
+
+import os
+
+import numpy as np
+
+
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('count', '<u4'), ('dtype', 'S4'), ('every', '<u4'), ('frames', '<u8'),
+                   ('padding', 'V32')])  # 64 bytes
+MAGIC = b'NBODYTRJ'
+VERSION = 1
+
+
+def _frame_size(count: int) -> int:
+	"""
+	Get the amount of values in a frame: the time, then the positions, velocities and masses of all bodies.
+
+	:param count: the amount of bodies
+	:return: The amount of values
+	"""
+
+	return 1 + 5 * count
+
+
+class TrajectoryWriter:
+	"""
+	Streams the state of a system of bodies into a memory-mapped binary file, one frame per write.
+	The file is preallocated in chunks of frames so writing a frame is a copy into the map, and it is cut to the written frames on close.
+
+	Attributes:
+		path: The path of the file.
+		count: The amount of bodies in every frame.
+		every: Only every k-th written frame is kept.
+		dtype: The type the values are stored as.
+		chunkFrames: The amount of frames the file grows by when it is full.
+		frames: The amount of frames kept.
+
+	Methods:
+		write: Writes a frame of the state of a system of bodies.
+		close: Flushes the file and cuts it to the written frames.
+	"""
+
+	def __init__(self, path: str, count: int, every: int = 1, dtype=np.float32, chunkFrames: int = 256):
+		"""
+		Create the file and preallocate the first chunk of frames.
+
+		:param path: the path of the file, it is overwritten if it exists
+		:param count: the amount of bodies in every frame
+		:param every: only keep every k-th written frame (default: 1, all frames)
+		:param dtype: the type the values are stored as, float32 halves the size (default: float32)
+		:param chunkFrames: the amount of frames the file grows by when it is full (default: 256)
+		"""
+
+		self.path = path
+		self.count = count
+		self.every = max(int(every), 1)
+		self.dtype = np.dtype(dtype).newbyteorder('<')
+		self.chunkFrames = chunkFrames
+		self.frames = 0
+		self.__writes = 0
+		self.__capacity = 0
+		self.__data = None
+
+		header = np.zeros((), HEADER)
+		header['magic'], header['version'], header['count'] = MAGIC, VERSION, count
+		header['dtype'], header['every'] = self.dtype.str.encode(), self.every
+		with open(path, 'wb') as file:
+			file.write(header.tobytes())
+
+		self.__header = np.memmap(path, HEADER, 'r+', shape=())
+		self.__grow()
+
+	def __grow(self):
+		"""
+		Grow the file by one chunk of frames and map it again.
+
+		:return: None
+		"""
+
+		if self.__data is not None:
+			self.__data.flush()
+		self.__data = None  # Release the old map before resizing the file
+
+		self.__capacity += self.chunkFrames
+		frameBytes = _frame_size(self.count) * self.dtype.itemsize
+		with open(self.path, 'r+b') as file:
+			file.truncate(HEADER.itemsize + self.__capacity * frameBytes)
+
+		self.__data = np.memmap(self.path, self.dtype, 'r+', offset=HEADER.itemsize, shape=(self.__capacity, _frame_size(self.count)))
+
+	def write(self, bodies: BodySystem, time: float = 0):
+		"""
+		Write the state of a system of bodies as a frame, if it is one of the kept frames.
+
+		:param bodies: the system of bodies
+		:param time: the simulated time of the frame (default: 0)
+		:return: None
+		"""
+
+		if len(bodies) != self.count:
+			raise ValueError(f"Trajectory holds {self.count} bodies, but the system has {len(bodies)}")
+
+		self.__writes += 1
+		if (self.__writes - 1) % self.every:
+			return
+
+		if self.frames == self.__capacity:
+			self.__grow()
+
+		count = self.count
+		frame = self.__data[self.frames]
+		frame[0] = time
+		frame[1:1 + 2 * count] = bodies.positions.ravel()
+		frame[1 + 2 * count:1 + 4 * count] = bodies.velocities.ravel()
+		frame[1 + 4 * count:] = bodies.masses
+
+		self.frames += 1
+		self.__header['frames'] = self.frames  # A reader sees every complete frame, even if the writer never closes
+
+	def close(self):
+		"""
+		Flush the file and cut it to the written frames.
+
+		:return: None
+		"""
+
+		if self.__data is None:
+			return
+
+		self.__data.flush()
+		self.__header.flush()
+		self.__data = None
+		self.__header = None
+
+		with open(self.path, 'r+b') as file:
+			file.truncate(HEADER.itemsize + self.frames * _frame_size(self.count) * self.dtype.itemsize)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+
+class Trajectory:
+	"""
+	A trajectory file written by TrajectoryWriter, memory-mapped read-only so frames are only read from disk when used.
+
+	Attributes:
+		path: The path of the file.
+		count: The amount of bodies in every frame.
+		every: Only every k-th frame of the simulation was kept.
+		times: (frames,) array of the simulated time of every frame.
+		positions: (frames, N, 2) array of body positions.
+		velocities: (frames, N, 2) array of body velocities.
+		masses: (frames, N) array of body masses.
+
+	Methods:
+		bodies: Creates a system of bodies in the state of a frame.
+	"""
+
+	def __init__(self, path: str):
+		"""
+		Map a trajectory file.
+
+		:param path: the path of the file
+		"""
+
+		self.path = path
+		header = np.fromfile(path, HEADER, count=1)
+		if len(header) == 0 or header[0]['magic'] != MAGIC:
+			raise ValueError(f"{path} is not a trajectory file")
+		if header[0]['version'] != VERSION:
+			raise ValueError(f"Unsupported trajectory version {header[0]['version']}")
+
+		self.count = int(header[0]['count'])
+		self.every = int(header[0]['every'])
+		dtype = np.dtype(header[0]['dtype'].decode())
+
+		# Frames beyond the end of the file (a writer that is still running) are not mapped
+		frameSize = _frame_size(self.count)
+		available = (os.path.getsize(path) - HEADER.itemsize) // (frameSize * dtype.itemsize)
+		frames = min(int(header[0]['frames']), available)
+
+		data = np.memmap(path, dtype, 'r', offset=HEADER.itemsize, shape=(frames, frameSize)) if frames else np.zeros((0, frameSize), dtype)
+		count = self.count
+		self.times = data[:, 0]
+		self.positions = data[:, 1:1 + 2 * count].reshape(frames, count, 2)
+		self.velocities = data[:, 1 + 2 * count:1 + 4 * count].reshape(frames, count, 2)
+		self.masses = data[:, 1 + 4 * count:]
+
+	def __len__(self):
+		return len(self.times)
+
+	def bodies(self, frame: int) -> BodySystem:
+		"""
+		Create a system of bodies in the state of a frame.
+
+		:param frame: the index of the frame
+		:return: The system of bodies
+		"""
+
+		return BodySystem.from_arrays(np.asarray(self.positions[frame], dtype=float), np.asarray(self.masses[frame], dtype=float),
+		                              np.asarray(self.velocities[frame], dtype=float))